@@ -0,0 +1,190 @@
+import math
+import os
+import re
+
+# Provider SDKs are imported in Backend.bind, so only the selected one is ever loaded
+
+MAX_COMPLETION_TOKENS = 1500
+SYSTEM_PROMPT = "You are a crypto market analyst."
+
+# Filled by register_backend
+BACKENDS = {}  # name -> Backend subclass
+AI_MODELS = {}  # name -> default model
+# Prompt tokens per call, leaving room for the completion inside the model's context
+MODEL_TOKEN_BUDGETS = {}
+# Default (requests, tokens) per minute; override with --rpm/--tpm to match your account tier
+MODEL_RATE_LIMITS = {}
+
+
+class Backend:
+    """One AI provider behind AsyncAIClient: a completion of a prompt, whole or streamed"""
+
+    def __init__(self, model: str):
+        self.model = model
+
+    def bind(self):
+        """Create the SDK client; called again whenever the client moves to a new event loop"""
+
+    async def complete(self, content: str) -> str:
+        raise NotImplementedError
+
+    async def stream(self, content: str):
+        """Pieces of the completion as they arrive; by default all of it at once"""
+        yield await self.complete(content)
+
+
+class OpenAIBackend(Backend):
+    def bind(self):
+        from openai import AsyncOpenAI
+        self._client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+
+    def _create(self, content: str, **options):
+        return self._client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": content}
+            ],
+            max_tokens=MAX_COMPLETION_TOKENS,
+            **options
+        )
+
+    async def complete(self, content: str) -> str:
+        response = await self._create(content)
+        return response.choices[0].message.content
+
+    async def stream(self, content: str):
+        response = await self._create(content, stream=True)
+        async for chunk in response:
+            if chunk.choices:
+                yield chunk.choices[0].delta.content
+
+
+class GeminiBackend(Backend):
+    def bind(self):
+        import google.generativeai as genai
+        genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
+        self._client = genai.GenerativeModel(self.model)
+
+    async def complete(self, content: str) -> str:
+        response = await self._client.generate_content_async(content)
+        return response.text
+
+    async def stream(self, content: str):
+        response = await self._client.generate_content_async(content, stream=True)
+        async for chunk in response:
+            yield chunk.text
+
+
+# Extractive summaries: one section per topic of the analysis prompts, keyed on word stems
+# (regular expressions, matched from the start of a word)
+EXTRACTIVE_TOPICS = {
+    'Key commercial and technical agreements': [
+        r'partner', r'agreement', r'integrat', r'collaborat', r'deals?\b', r'acqui', r'merger', r'listing',
+        r'lists\b', r'launch', r'mainnet', r'upgrade', r'hard ?fork', r'airdrop', r'adopt'
+    ],
+    'Government decisions and regulations': [
+        r'sec\b', r'regulat', r'laws?\b', r'bans?\b', r'banned', r'court', r'lawsuit', r'sue[sd]?\b', r'etfs?\b',
+        r'approv', r'government', r'tax', r'cftc', r'complian', r'licen', r'legal', r'bill\b', r'senat',
+        r'congress', r'ministry', r'central bank'
+    ],
+    'Geopolitical events affecting cryptocurrency': [
+        r'wars?\b', r'election', r'sanction', r'china', r'russia', r'ukrain', r'fed\b', r'federal reserve',
+        r'interest rate', r'inflation', r'tariff', r'iran', r'israel', r'conflict', r'recession', r'g20\b', r'imf\b'
+    ],
+    'Major market movements': [
+        r'pump', r'dump', r'rall(?:y|ies)', r'crash', r'surg', r'soar', r'plung', r'breakout', r'ath\b',
+        r'all-time high', r'liquidat', r'whale', r'price', r'volume', r'record', r'drop', r'jump'
+    ]
+}
+EXTRACTIVE_PER_TOPIC = 5
+EXTRACTIVE_MAX_CHARS = 300
+EXTRACTIVE_INTRO = "Offline extractive summary: the most informative and most repeated messages for each topic."
+
+_WEIGHT = re.compile(r'^\[x(\d+)\] ')
+_FIGURE = re.compile(r'\d+(?:[.,]\d+)?\s?(?:%|[kmb]\b|billion|million)|\$\d', re.IGNORECASE)
+
+
+class ExtractiveBackend(Backend):
+    """Offline summarizer: quotes the messages that best match each topic of the prompt.
+
+    Prompts are the analysis or map/reduce prompt, a blank line, a header line and one
+    message (or line of a partial summary) per line. Needs no network or API key, so
+    reports can be built in CI or when the providers are unreachable.
+    """
+
+    def __init__(self, model: str):
+        super().__init__(model)
+        self.topics = {
+            topic: re.compile(r'\b(?:' + '|'.join(words) + ')', re.IGNORECASE)
+            for topic, words in EXTRACTIVE_TOPICS.items()
+        }
+
+    @staticmethod
+    def _items(content: str) -> list:
+        """(weight, text) for each message or summary bullet below the prompt's header line"""
+        body = content.split('\n\n', 1)[-1].split('\n', 1)
+        items = []
+        for line in body[1].split('\n') if len(body) > 1 else []:
+            line = line.strip()
+            if line.startswith('- '):
+                line = line[2:]
+            if not line or line.startswith('#') or line == EXTRACTIVE_INTRO:
+                continue
+            weight = _WEIGHT.match(line)
+            items.append((int(weight.group(1)) if weight else 1, line[weight.end():] if weight else line))
+        return items
+
+    def _score(self, text: str) -> tuple:
+        """Best-matching topic and score: distinct topic words, concrete figures and length"""
+        best_topic, best_hits = None, 0
+        for topic, pattern in self.topics.items():
+            hits = len({match.lower() for match in pattern.findall(text)})
+            if hits > best_hits:
+                best_topic, best_hits = topic, hits
+        score = best_hits + (0.5 if _FIGURE.search(text) else 0) + min(len(text), 200) / 400
+        return best_topic, score
+
+    async def complete(self, content: str) -> str:
+        sections = {topic: {} for topic in self.topics}
+        for weight, text in self._items(content):
+            topic, score = self._score(text)
+            if topic is None:
+                continue
+            key = ' '.join(text.lower().split())
+            seen = sections[topic].get(key)
+            # Repeats merge, so a message posted in several batches keeps its full weight
+            sections[topic][key] = (seen[0] + weight if seen else weight, score, text)
+        lines = [EXTRACTIVE_INTRO]
+        for topic, entries in sections.items():
+            if not entries:
+                continue
+            ranked = sorted(entries.values(), key=lambda entry: math.log2(entry[0]) + entry[1], reverse=True)
+            lines.append(f"\n## {topic}")
+            for weight, _, text in ranked[:EXTRACTIVE_PER_TOPIC]:
+                if len(text) > EXTRACTIVE_MAX_CHARS:
+                    text = text[:EXTRACTIVE_MAX_CHARS].rsplit(' ', 1)[0] + '...'
+                lines.append(f"- [x{weight}] {text}" if weight > 1 else f"- {text}")
+        if len(lines) == 1:
+            lines.append("\nNo messages matched the analysis topics.")
+        return '\n'.join(lines)
+
+
+def register_backend(name: str, backend_class, model: str, token_budget: int, rate_limits: tuple):
+    """Make a provider selectable by name (--ai) with its default model, token budget and quotas"""
+    BACKENDS[name] = backend_class
+    AI_MODELS[name] = model
+    MODEL_TOKEN_BUDGETS[model] = token_budget
+    MODEL_RATE_LIMITS[model] = rate_limits
+
+
+def create_backend(name: str, model: str = None) -> Backend:
+    if name not in BACKENDS:
+        raise ValueError(f"Invalid AI service '{name}', choose from {', '.join(BACKENDS)}")
+    return BACKENDS[name](model or AI_MODELS[name])
+
+
+register_backend('openai', OpenAIBackend, 'gpt-3.5-turbo', 12000, (500, 200000))
+register_backend('gemini', GeminiBackend, 'gemini-1.5-flash', 500000, (15, 1000000))
+# Local and free: budgeted so that a whole window is summarized in one call
+register_backend('extractive', ExtractiveBackend, 'extractive', 1000000, (100000, 10 ** 9))
@@ -0,0 +1,374 @@
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from telethon.errors import FloodWaitError
+
+from crypto_cynic_rate_limiter import TokenBucket
+from crypto_cynic_tg_reporter import CRYPTO_DICT, CryptoAnalyzer, MentionMatcher, _init_preprocess, _preprocess_chunk
+from crypto_cynic_tg_scraper import MESSAGES_PER_REQUEST, MessageSink, Shard, scrape_channel, scrape_shards
+
+# Python 3.10 recommended - python crypto_cynic_benchmark.py --messages 50000
+# Runs offline: Telegram and the AI service are replaced by local fakes with configurable latency
+
+FILLER_WORDS = [
+    'the', 'market', 'is', 'pumping', 'today', 'buy', 'sell', 'signal', 'entry', 'target',
+    'stop', 'loss', 'long', 'short', 'breakout', 'support', 'resistance', 'volume', 'whales',
+    'are', 'accumulating', 'news', 'listing', 'exchange', 'announced', 'partnership', 'with',
+    "don't", 'miss', 'this', 'one', 'gas', 'fees', 'just', 'went', 'up', 'to', 'the', 'moon'
+]
+
+def generate_corpus(messages: int, ticker_density: float = 0.08, seed: int = 42) -> list:
+    """Synthetic Telegram-style messages with a given share of ticker/name tokens"""
+    rng = random.Random(seed)
+    names = list(CRYPTO_DICT)
+    symbols = list(CRYPTO_DICT.values())
+    corpus = []
+    for _ in range(messages):
+        words = []
+        for _ in range(rng.randint(8, 120)):
+            roll = rng.random()
+            if roll < ticker_density / 2:
+                words.append(rng.choice(names).title())
+            elif roll < ticker_density:
+                symbol = rng.choice(symbols)
+                words.append(f"${symbol}" if rng.random() < 0.5 else symbol)
+            else:
+                words.append(rng.choice(FILLER_WORDS))
+        corpus.append(' '.join(words))
+    return corpus
+
+class FakeMessage:
+    """The attributes of a Telethon message that the scraper reads"""
+    
+    def __init__(self, message_id: int, date: datetime, text: str, views: int, forwards: int):
+        self.id = message_id
+        self.date = date
+        self.text = text
+        self.views = views
+        self.forwards = forwards
+        self.replies = None
+
+def generate_channels(channels: int, messages_per_channel: int, hours: float, ticker_density: float = 0.08,
+                      seed: int = 42) -> dict:
+    """Synthetic channel histories, newest message first, spread over 1.2x `hours`.
+    
+    Channel sizes are skewed like real ones: a few busy channels and a long tail of quiet ones.
+    """
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    span = hours * 1.2 * 3600
+    histories = {}
+    for index in range(channels):
+        count = max(1, int(rng.lognormvariate(0, 1) * messages_per_channel / 1.65))
+        texts = generate_corpus(count, ticker_density, seed + index)
+        ages = sorted(rng.uniform(0, span) for _ in range(count))
+        histories[f"channel_{index}"] = [
+            FakeMessage(count - position, now - timedelta(seconds=age), text,
+                        int(rng.paretovariate(1.5) * 100), int(rng.paretovariate(2) * 2))
+            for position, (age, text) in enumerate(zip(ages, texts))
+        ]
+    return histories
+
+class FakeTelegramClient:
+    """Serves `generate_channels` histories through get_entity/iter_messages/get_messages.
+    
+    Every request (entity lookup or page of MESSAGES_PER_REQUEST messages) waits `latency`
+    seconds and raises a FloodWaitError of `flood_seconds` with probability `flood_rate`.
+    """
+    
+    def __init__(self, histories: dict, latency: float = 0.05, flood_rate: float = 0.0,
+                 flood_seconds: int = 1, seed: int = 42):
+        self.histories = histories
+        self.latency = latency
+        self.flood_rate = flood_rate
+        self.flood_seconds = flood_seconds
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.flood_waits = 0
+    
+    async def _request(self):
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        if self.rng.random() < self.flood_rate:
+            self.flood_waits += 1
+            raise FloodWaitError(request=None, capture=self.flood_seconds)
+    
+    async def get_entity(self, username: str):
+        await self._request()
+        if username not in self.histories:
+            raise ValueError(f"No user has \"{username}\" as username")
+        return username
+    
+    async def iter_messages(self, entity, min_id: int = 0, offset_id: int = 0):
+        messages = [message for message in self.histories[entity]
+                    if message.id > min_id and (not offset_id or message.id < offset_id)]
+        for start in range(0, len(messages), MESSAGES_PER_REQUEST):
+            await self._request()
+            for message in messages[start:start + MESSAGES_PER_REQUEST]:
+                yield message
+    
+    async def get_messages(self, entity, limit: int = MESSAGES_PER_REQUEST, offset_id: int = 0):
+        messages = [message for message in self.histories[entity] if not offset_id or message.id < offset_id][:limit]
+        for _ in range(max(1, -(-len(messages) // MESSAGES_PER_REQUEST))):
+            await self._request()
+        return messages
+    
+    async def iter_dialogs(self):
+        # The fake account has joined nothing, so entity caches are warmed by lookups only
+        await self._request()
+        return
+        yield
+    
+    async def disconnect(self):
+        pass
+
+class StubAIClient:
+    """Stands in for AsyncAIClient: answers every call with a fixed summary after `latency` seconds"""
+    
+    def __init__(self, latency: float = 0.5):
+        self.latency = latency
+        self.calls = 0
+        self.prompt_tokens = 0
+    
+    SUMMARY = "Market summary: BTC and ETH lead mentions; several listings announced."
+    
+    async def complete(self, content: str, prompt_tokens: int) -> str:
+        self.calls += 1
+        self.prompt_tokens += prompt_tokens
+        await asyncio.sleep(self.latency)
+        return self.SUMMARY
+    
+    async def stream(self, content: str, prompt_tokens: int, on_text) -> tuple:
+        # The latency is spread over the words, like tokens arriving from a streaming API
+        self.calls += 1
+        self.prompt_tokens += prompt_tokens
+        words = self.SUMMARY.split(' ')
+        for index, word in enumerate(words):
+            await asyncio.sleep(self.latency / len(words))
+            on_text(word if index == 0 else f" {word}")
+        return self.SUMMARY, True
+
+def stub_analyzer(ai_latency: float) -> CryptoAnalyzer:
+    """An analyzer with the stub AI backend and no on-disk caches"""
+    analyzer = CryptoAnalyzer('openai', True, 'benchmark', use_cache=False, use_buckets=False)
+    analyzer.ai_client = StubAIClient(ai_latency)
+    return analyzer
+
+def percentile(values: list, share: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))] if ordered else 0.0
+
+def legacy_count_mentions(crypto_dict: dict, messages: list) -> dict:
+    """The original substring-counting implementation, kept as a baseline"""
+    mentions = {name: 0 for name in crypto_dict.keys()}
+    for message in messages:
+        if not isinstance(message, str):
+            continue
+        message = message.lower()
+        for name, symbol in crypto_dict.items():
+            mentions[name] += message.count(name)
+            mentions[name] += message.count(symbol.lower())
+    return mentions
+
+def timed(func, *args, repeat: int = 3) -> float:
+    """Best wall-clock time of `repeat` runs, in seconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def bench_count_mentions(corpus: list) -> dict:
+    matcher = MentionMatcher(CRYPTO_DICT)
+    size_mb = sum(len(message) for message in corpus) / 1e6
+    legacy = timed(legacy_count_mentions, CRYPTO_DICT, corpus)
+    single_pass = timed(matcher.count, corpus)
+    return {
+        'messages': len(corpus),
+        'corpus_mb': round(size_mb, 2),
+        'legacy_s': round(legacy, 3),
+        'legacy_mb_per_s': round(size_mb / legacy, 2),
+        'single_pass_s': round(single_pass, 3),
+        'single_pass_mb_per_s': round(size_mb / single_pass, 2),
+        'speedup': round(legacy / single_pass, 1)
+    }
+
+async def bench_scrape_channel(histories: dict, hours: float, workers: int, rate: float, latency: float,
+                               flood_rate: float, flood_seconds: int) -> dict:
+    """Scrape every fake channel with `workers` concurrent scrape_channel calls"""
+    client = FakeTelegramClient(histories, latency, flood_rate, flood_seconds)
+    limiter = TokenBucket(rate, capacity=max(rate, workers))
+    sink = MessageSink(lambda channel: [])
+    semaphore = asyncio.Semaphore(workers)
+    latencies = []
+    
+    async def timed_channel(channel):
+        async with semaphore:
+            started = time.perf_counter()
+            await scrape_channel(client, channel, hours, sink, limiter)
+            latencies.append(time.perf_counter() - started)
+    
+    started = time.perf_counter()
+    await asyncio.gather(*(timed_channel(channel) for channel in histories))
+    elapsed = time.perf_counter() - started
+    sink.flush()
+    return {
+        'channels': len(histories),
+        'messages': sink.written,
+        'requests': client.requests,
+        'flood_waits': client.flood_waits,
+        'seconds': round(elapsed, 3),
+        'messages_per_s': round(sink.written / elapsed, 1),
+        'channel_p50_s': round(percentile(latencies, 0.5), 3),
+        'channel_p95_s': round(percentile(latencies, 0.95), 3)
+    }
+
+def window_records(histories: dict, hours: float) -> list:
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=hours)
+    return [
+        {'channel': channel, 'message_id': message.id, 'date': message.date, 'text': message.text,
+         'views': message.views, 'forwards': message.forwards, 'replies': 0}
+        for channel, messages in histories.items() for message in messages if message.date >= cutoff
+    ]
+
+async def bench_report(records: list, ai_latency: float) -> dict:
+    """Dedup, selection, stub AI map-reduce, mention counting and report writing"""
+    analyzer = stub_analyzer(ai_latency)
+    started = time.perf_counter()
+    await analyzer.analyze_records_async(records)
+    elapsed = time.perf_counter() - started
+    return {
+        'messages': len(records),
+        'ai_calls': analyzer.ai_client.calls,
+        'ai_prompt_tokens': analyzer.ai_client.prompt_tokens,
+        'seconds': round(elapsed, 3),
+        'messages_per_s': round(len(records) / elapsed, 1)
+    }
+
+class NullEntityCache:
+    """Entity cache that never holds anything, so every run resolves channels"""
+    
+    def get(self, username):
+        return None
+    
+    def put(self, username, entity):
+        pass
+    
+    def invalidate(self, username):
+        pass
+    
+    def save(self):
+        pass
+
+async def bench_end_to_end(histories: dict, hours: float, workers: int, rate: float, latency: float,
+                           flood_rate: float, flood_seconds: int, ai_latency: float, shards: int = 1) -> dict:
+    """Scrape into memory followed by the analysis, as run_pipeline does, with `shards` fake accounts"""
+    shard_list = [
+        Shard(f"account_{index}", FakeTelegramClient(histories, latency, flood_rate, flood_seconds, seed=index),
+              TokenBucket(rate, capacity=max(rate, workers)), NullEntityCache())
+        for index in range(shards)
+    ]
+    analyzer = stub_analyzer(ai_latency)
+    registry = {channel: ['trading'] for channel in histories}
+    started = time.perf_counter()
+    _, records = await scrape_shards(shard_list, registry, hours, workers, write_csv=False, collect=True)
+    scraped = time.perf_counter()
+    await analyzer.analyze_records_async(records)
+    finished = time.perf_counter()
+    return {
+        'shards': shards,
+        'messages': len(records),
+        'scrape_s': round(scraped - started, 3),
+        'analysis_s': round(finished - scraped, 3),
+        'seconds': round(finished - started, 3),
+        'messages_per_s': round(len(records) / (finished - started), 1)
+    }
+
+def bench_preprocess(records: list, processes: int) -> dict:
+    """Token counts, dedup fingerprints and mentions: inline versus the process pool"""
+    analyzer = stub_analyzer(0)
+    analyzer.processes = processes
+    texts = [record['text'] for record in records]
+    _init_preprocess(analyzer.mention_matcher, analyzer.dedup_filter, analyzer.model, bool(analyzer._get_encoding()))
+    inline = timed(_preprocess_chunk, texts, repeat=1)
+    # One asyncio.run per call, so the time includes starting the pool's workers
+    pool = timed(lambda: asyncio.run(analyzer.preprocess(records)), repeat=1)
+    analyzer.close()
+    return {
+        'messages': len(records),
+        'processes': processes,
+        'inline_s': round(inline, 3),
+        'pool_s': round(pool, 3),
+        'speedup': round(inline / pool, 1)
+    }
+
+def print_results(name: str, results: dict):
+    print(name)
+    for key, value in results.items():
+        print(f"  {key}: {value}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Crypto Reporter Benchmarks')
+    parser.add_argument('--suites', nargs='+', default=['count_mentions', 'scrape_channel', 'report', 'end_to_end'],
+                       choices=['count_mentions', 'preprocess', 'scrape_channel', 'report', 'end_to_end'],
+                       help='Benchmarks to run (default: all)')
+    parser.add_argument('--messages', type=int, default=20000,
+                       help='Number of synthetic messages for count_mentions (default: 20000)')
+    parser.add_argument('--ticker_density', type=float, default=0.08,
+                       help='Share of words that are coin names or symbols (default: 0.08)')
+    parser.add_argument('--channels', type=int, default=231,
+                       help='Number of fake channels (default: 231, the size of channels.json)')
+    parser.add_argument('--messages_per_channel', type=int, default=100,
+                       help='Mean messages per fake channel (default: 100)')
+    parser.add_argument('--hours', type=float, default=24,
+                       help='Scrape window in hours (default: 24)')
+    parser.add_argument('--workers', type=int, default=8,
+                       help='Concurrent channel scrapes (default: 8)')
+    parser.add_argument('--rate', type=float, default=20,
+                       help='Fake Telegram requests per second allowed by the limiter (default: 20)')
+    parser.add_argument('--latency', type=float, default=0.05,
+                       help='Seconds per fake Telegram request (default: 0.05)')
+    parser.add_argument('--flood_rate', type=float, default=0.01,
+                       help='Probability that a fake Telegram request raises FloodWait (default: 0.01)')
+    parser.add_argument('--flood_seconds', type=int, default=1,
+                       help='Seconds of each injected FloodWait (default: 1)')
+    parser.add_argument('--ai_latency', type=float, default=0.5,
+                       help='Seconds per stub AI call (default: 0.5)')
+    parser.add_argument('--processes', type=int, default=os.cpu_count(),
+                       help='Processes for the preprocess suite (default: all cores)')
+    parser.add_argument('--shards', type=int, default=1,
+                       help='Fake accounts the end-to-end run is sharded across (default: 1)')
+    args = parser.parse_args()
+
+    if 'count_mentions' in args.suites:
+        print_results("count_mentions", bench_count_mentions(generate_corpus(args.messages, args.ticker_density)))
+    
+    if 'preprocess' in args.suites:
+        corpus = generate_corpus(args.messages, args.ticker_density)
+        records = [{'channel': 'benchmark', 'message_id': index, 'text': text} for index, text in enumerate(corpus)]
+        print_results("preprocess", bench_preprocess(records, args.processes))
+    
+    histories = generate_channels(args.channels, args.messages_per_channel, args.hours, args.ticker_density)
+    telegram = (args.hours, args.workers, args.rate, args.latency, args.flood_rate, args.flood_seconds)
+    # Reports and any files the pipeline writes go to a scratch directory
+    workdir = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)
+        try:
+            if 'scrape_channel' in args.suites:
+                print_results("scrape_channel", asyncio.run(bench_scrape_channel(histories, *telegram)))
+            if 'report' in args.suites:
+                print_results("report", asyncio.run(bench_report(window_records(histories, args.hours), args.ai_latency)))
+            if 'end_to_end' in args.suites:
+                print_results("end_to_end", asyncio.run(bench_end_to_end(histories, *telegram, args.ai_latency, args.shards)))
+        finally:
+            os.chdir(workdir)
+
+if __name__ == '__main__':
+    main()
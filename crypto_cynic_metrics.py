@@ -0,0 +1,121 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+METRIC_PREFIX = "crypto_cynic_"
+
+
+class Metrics:
+    """In-process counters and timings, exported as a Prometheus text file or JSON.
+
+    Timings are kept as Prometheus summaries without quantiles (count and sum) plus the
+    maximum, per name and label set.
+    """
+
+    def __init__(self):
+        self.counters = {}  # (name, labels) -> value
+        self.timings = {}  # (name, labels) -> [count, sum, max]
+        self.started = time.time()
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = self._key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        timing = self.timings.setdefault(self._key(name, labels), [0, 0.0, 0.0])
+        timing[0] += 1
+        timing[1] += seconds
+        timing[2] = max(timing[2], seconds)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Observe the duration of the `with` block, also when it raises"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def snapshot(self) -> dict:
+        """JSON-friendly view: counters and timings as lists of {name, labels, ...}"""
+        return {
+            'started': self.started,
+            'exported': time.time(),
+            'counters': [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in sorted(self.counters.items())
+            ],
+            'timings': [
+                {'name': name, 'labels': dict(labels), 'count': count, 'sum': round(total, 6), 'max': round(peak, 6)}
+                for (name, labels), (count, total, peak) in sorted(self.timings.items())
+            ]
+        }
+
+    def prometheus(self) -> str:
+        """Prometheus text exposition format"""
+        def series(name, labels, suffix=''):
+            label_text = ','.join(f'{key}="{value}"' for key, value in labels)
+            return f"{METRIC_PREFIX}{name}{suffix}{{{label_text}}}" if label_text else f"{METRIC_PREFIX}{name}{suffix}"
+
+        lines = []
+        typed = set()
+        for (name, labels), value in sorted(self.counters.items()):
+            if name not in typed:
+                lines.append(f"# TYPE {METRIC_PREFIX}{name} counter")
+                typed.add(name)
+            lines.append(f"{series(name, labels)} {value}")
+        # Each family's lines must be contiguous, so the maxima follow as a separate gauge family
+        families = {}
+        for (name, labels), timing in sorted(self.timings.items()):
+            families.setdefault(name, []).append((labels, timing))
+        for name, entries in families.items():
+            lines.append(f"# TYPE {METRIC_PREFIX}{name} summary")
+            for labels, (count, total, _) in entries:
+                lines.append(f"{series(name, labels, '_count')} {count}")
+                lines.append(f"{series(name, labels, '_sum')} {total:.6f}")
+            lines.append(f"# TYPE {METRIC_PREFIX}{name}_max gauge")
+            for labels, (_, _, peak) in entries:
+                lines.append(f"{series(name, labels, '_max')} {peak:.6f}")
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path: str):
+        """Write JSON if `path` ends in .json, Prometheus text otherwise (e.g. for node_exporter's textfile collector)"""
+        content = json.dumps(self.snapshot(), indent=2) if path.endswith('.json') else self.prometheus()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+        logging.info(f"Metrics written to {path}")
+
+    async def serve(self, port: int, host: str = '0.0.0.0'):
+        """Serve the metrics over HTTP for a Prometheus scrape (JSON when the path ends in .json)"""
+        async def handle(reader, writer):
+            try:
+                request = (await reader.readline()).decode('latin-1').split()
+                while (await reader.readline()).strip():
+                    pass
+                if len(request) > 1 and request[1].endswith('.json'):
+                    body, content_type = json.dumps(self.snapshot()), 'application/json'
+                else:
+                    body, content_type = self.prometheus(), 'text/plain; version=0.0.4'
+                body = body.encode('utf-8')
+                writer.write(f"HTTP/1.1 200 OK\r\nContent-Type: {content_type}\r\n"
+                             f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('latin-1') + body)
+                await writer.drain()
+            finally:
+                writer.close()
+
+        server = await asyncio.start_server(handle, host, port)
+        logging.info(f"Serving metrics on port {port}")
+        return server
+
+
+# Shared by the scraper and the reporter, like a default Prometheus registry
+metrics = Metrics()
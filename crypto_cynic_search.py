@@ -0,0 +1,200 @@
+import argparse
+import logging
+import math
+import sqlite3
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from crypto_cynic_tg_reporter import CRYPTO_DICT, CryptoAnalyzer, MentionMatcher
+
+# python crypto_cynic_search.py listing --symbol PEPE --hours 6
+# python crypto_cynic_search.py --symbol PEPE --hours 6 --by_channel
+
+SEARCH_DB_FILE = "crypto_search.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    channel TEXT NOT NULL,
+    message_id INTEGER NOT NULL,
+    date REAL NOT NULL,
+    text TEXT,
+    symbols TEXT NOT NULL,  -- symbols of the coins mentioned, indexed alongside the text
+    views INTEGER,
+    forwards INTEGER,
+    replies INTEGER,
+    engagement REAL NOT NULL,
+    UNIQUE (channel, message_id)
+);
+CREATE INDEX IF NOT EXISTS ix_messages_date ON messages (date);
+CREATE INDEX IF NOT EXISTS ix_messages_channel_date ON messages (channel, date);
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    text, symbols, content='messages', content_rowid='id'
+);
+"""
+
+
+def _number(value):
+    # None for missing values and pandas NaN
+    return None if value is None or (isinstance(value, float) and math.isnan(value)) else int(value)
+
+
+class SearchIndex:
+    """Incremental SQLite FTS5 index of scraped messages, searchable by words, coin, channel and time.
+
+    Each message's text is indexed together with the symbols of the coins it mentions, so
+    "PEPE" finds cashtags, bare tickers and "pepe" spelled out alike. Messages are keyed on
+    (channel, message_id); indexing one again replaces it.
+    """
+
+    def __init__(self, path: str = SEARCH_DB_FILE):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+        self.crypto_dict = CRYPTO_DICT
+        self.matcher = MentionMatcher(CRYPTO_DICT)
+
+    def upsert(self, records: list) -> int:
+        """Index records, replacing earlier copies of the same messages; returns the count"""
+        dates = pd.to_datetime([record['date'] for record in records], utc=True, errors='coerce')
+        with self.connection:
+            for record, date in zip(records, dates):
+                if pd.isna(date):
+                    continue
+                text = record.get('text') if isinstance(record.get('text'), str) else None
+                symbols = ' '.join(self.crypto_dict[name] for name in self.matcher.mentions_in(text)) if text else ''
+                old = self.connection.execute(
+                    "SELECT id, text, symbols FROM messages WHERE channel = ? AND message_id = ?",
+                    (record['channel'], int(record['message_id']))
+                ).fetchone()
+                if old:
+                    # External-content FTS tables are updated by deleting the old terms first
+                    self.connection.execute(
+                        "INSERT INTO messages_fts (messages_fts, rowid, text, symbols) VALUES ('delete', ?, ?, ?)",
+                        (old['id'], old['text'] or '', old['symbols'])
+                    )
+                    self.connection.execute("DELETE FROM messages WHERE id = ?", (old['id'],))
+                cursor = self.connection.execute(
+                    "INSERT INTO messages (channel, message_id, date, text, symbols, views, forwards, replies, engagement) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (record['channel'], int(record['message_id']), date.timestamp(), text, symbols,
+                     _number(record.get('views')), _number(record.get('forwards')), _number(record.get('replies')),
+                     CryptoAnalyzer._engagement(record))
+                )
+                self.connection.execute(
+                    "INSERT INTO messages_fts (rowid, text, symbols) VALUES (?, ?, ?)",
+                    (cursor.lastrowid, text or '', symbols)
+                )
+        return len(records)
+
+    def _where(self, query: str, symbol: str, channel: str, since: float, until: float) -> tuple:
+        """FROM/WHERE clause and parameters shared by search and by_channel"""
+        clauses, params = [], []
+        match = []
+        if query:
+            match.append(f"text:({query})")
+        if symbol:
+            # Coin names are accepted too ("pepe" -> PEPE)
+            match.append(f'symbols:"{self.crypto_dict.get(symbol.lower(), symbol).upper()}"')
+        if match:
+            source = "messages_fts JOIN messages m ON m.id = messages_fts.rowid"
+            clauses.append("messages_fts MATCH ?")
+            params.append(' AND '.join(match))
+        else:
+            source = "messages m"
+        if channel:
+            clauses.append("m.channel = ? COLLATE NOCASE")
+            params.append(channel)
+        if since is not None:
+            clauses.append("m.date >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("m.date < ?")
+            params.append(until)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return f"FROM {source}{where}", params
+
+    def search(self, query: str = None, symbol: str = None, channel: str = None,
+               since: float = None, until: float = None, limit: int = 20) -> list:
+        """Matching messages, most engaging first; `query` is FTS5 syntax, `since`/`until` epoch seconds"""
+        source, params = self._where(query, symbol, channel, since, until)
+        rows = self.connection.execute(
+            f"SELECT m.channel, m.message_id, m.date, m.text, m.views, m.forwards, m.replies, m.engagement "
+            f"{source} ORDER BY m.engagement DESC, m.date DESC LIMIT ?",
+            params + [limit]
+        ).fetchall()
+        return [dict(row, date=datetime.fromtimestamp(row['date'], timezone.utc)) for row in rows]
+
+    def by_channel(self, query: str = None, symbol: str = None, channel: str = None,
+                   since: float = None, until: float = None, limit: int = 20) -> list:
+        """Channels with matching messages: message count and total engagement, highest first"""
+        source, params = self._where(query, symbol, channel, since, until)
+        rows = self.connection.execute(
+            f"SELECT m.channel, COUNT(*) AS messages, SUM(m.engagement) AS engagement "
+            f"{source} GROUP BY m.channel ORDER BY engagement DESC LIMIT ?",
+            params + [limit]
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self):
+        self.connection.close()
+
+
+def load_message_file(path: str) -> list:
+    """Records from a scraper CSV or Parquet file"""
+    frame = pd.read_parquet(path) if path.endswith('.parquet') else pd.read_csv(path)
+    return frame.to_dict('records')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Search collected Telegram messages')
+    parser.add_argument('query', nargs='?',
+                       help='Words to search for, in SQLite FTS5 syntax ("new listing", binance OR coinbase, pump*)')
+    parser.add_argument('--symbol',
+                       help='Only messages mentioning this coin, by symbol or name')
+    parser.add_argument('--channel',
+                       help='Only messages from this channel')
+    parser.add_argument('--hours', type=float,
+                       help='Only messages from the last N hours')
+    parser.add_argument('--limit', type=int, default=20,
+                       help='Number of results (default: 20)')
+    parser.add_argument('--by_channel', action='store_true',
+                       help='List matching channels with message counts and engagement instead of messages')
+    parser.add_argument('--index', default=SEARCH_DB_FILE,
+                       help=f'Search index file (default: {SEARCH_DB_FILE})')
+    parser.add_argument('--add', nargs='+', metavar='FILE',
+                       help='Index scraper CSV or Parquet files, e.g. kept with --keep_files')
+    args = parser.parse_args()
+
+    index = SearchIndex(args.index)
+    try:
+        if args.add:
+            for path in args.add:
+                logging.info(f"Indexed {index.upsert(load_message_file(path))} messages from {path}")
+            if not (args.query or args.symbol or args.channel):
+                return
+
+        since = time.time() - args.hours * 3600 if args.hours else None
+        started = time.perf_counter()
+        if args.by_channel:
+            results = index.by_channel(args.query, args.symbol, args.channel, since, limit=args.limit)
+            for row in results:
+                print(f"{row['channel']}: {row['messages']} messages, engagement {row['engagement']:.1f}")
+        else:
+            results = index.search(args.query, args.symbol, args.channel, since, limit=args.limit)
+            for row in results:
+                text = ' '.join((row['text'] or '').split())
+                print(f"[{row['date']:%Y-%m-%d %H:%M}] {row['channel']} #{row['message_id']} "
+                      f"(views {row['views']}, forwards {row['forwards']}): {text[:200]}")
+        print(f"{len(results)} results in {(time.perf_counter() - started) * 1000:.1f} ms")
+    except sqlite3.OperationalError as e:
+        logging.error(f"Search failed: {e}")
+    finally:
+        index.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+import logging
+import math
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+from sqlalchemy import (BigInteger, Column, DateTime, Index, Integer, MetaData, String, Table, Text,
+                        create_engine, select)
+from sqlalchemy.dialects import postgresql, sqlite
+
+DEFAULT_DB_URL = "sqlite:///crypto_messages.db"
+UPSERT_BATCH = 500
+
+metadata = MetaData()
+
+messages = Table(
+    'messages', metadata,
+    Column('channel', String(64), primary_key=True),
+    Column('message_id', BigInteger, primary_key=True),
+    Column('date', DateTime, nullable=False),  # UTC
+    Column('text', Text),
+    Column('views', Integer),
+    Column('forwards', Integer),
+    Column('replies', Integer),
+    Index('ix_messages_channel_date', 'channel', 'date'),
+    Index('ix_messages_date', 'date'),
+)
+
+# Columns refreshed when a message is scraped again (edits, growing view counts)
+UPDATE_COLUMNS = ['date', 'text', 'views', 'forwards', 'replies']
+
+
+def _utc(value) -> datetime:
+    """Naive UTC datetime from a datetime, pandas Timestamp or CSV string (naive means UTC)"""
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo:
+        timestamp = timestamp.tz_convert('UTC').tz_localize(None)
+    return timestamp.to_pydatetime()
+
+
+def _clean(value):
+    # pandas gives NaN for empty CSV cells
+    return None if isinstance(value, float) and math.isnan(value) else value
+
+
+class MessageStore:
+    """Scraped messages keyed on (channel, message_id), in SQLite by default or any SQLAlchemy URL"""
+
+    def __init__(self, url: str = DEFAULT_DB_URL):
+        self.engine = create_engine(url)
+        metadata.create_all(self.engine)
+        dialect = self.engine.dialect.name
+        if dialect == 'sqlite':
+            self._insert = sqlite.insert
+        elif dialect == 'postgresql':
+            self._insert = postgresql.insert
+        else:
+            raise ValueError(f"Unsupported database '{dialect}', use SQLite or PostgreSQL")
+
+    def upsert(self, records: list) -> int:
+        """Insert records, replacing earlier copies of the same messages; returns the count"""
+        # One row per key: PostgreSQL rejects a batch that updates the same row twice, as a live
+        # message and its edit would; the later copy wins, as it would across batches
+        rows = {}
+        for record in records:
+            key = (record['channel'], int(record['message_id']))
+            rows.pop(key, None)
+            rows[key] = {
+                'channel': record['channel'],
+                'message_id': int(record['message_id']),
+                'date': _utc(record['date']),
+                'text': _clean(record.get('text')),
+                'views': _clean(record.get('views')),
+                'forwards': _clean(record.get('forwards')),
+                'replies': _clean(record.get('replies')),
+            }
+        rows = list(rows.values())
+        statement = self._insert(messages)
+        statement = statement.on_conflict_do_update(
+            index_elements=['channel', 'message_id'],
+            set_={column: statement.excluded[column] for column in UPDATE_COLUMNS}
+        )
+        with self.engine.begin() as connection:
+            for start in range(0, len(rows), UPSERT_BATCH):
+                connection.execute(statement, rows[start:start + UPSERT_BATCH])
+        return len(rows)
+
+    def messages(self, start: datetime, end: datetime = None, channels: list = None) -> list:
+        """Message records dated from `start` up to `end`, oldest first"""
+        query = select(messages).where(messages.c.date >= _utc(start))
+        if end is not None:
+            query = query.where(messages.c.date < _utc(end))
+        if channels is not None:
+            query = query.where(messages.c.channel.in_(list(channels)))
+        query = query.order_by(messages.c.date)
+        with self.engine.connect() as connection:
+            records = [dict(row._mapping) for row in connection.execute(query)]
+        for record in records:
+            record['date'] = record['date'].replace(tzinfo=timezone.utc)
+        logging.info(f"Loaded {len(records)} messages from the store")
+        return records
+
+    def window(self, hours_back: float, channels: list = None) -> list:
+        """Message records from the last `hours_back` hours"""
+        return self.messages(datetime.now(timezone.utc) - timedelta(hours=hours_back), channels=channels)
@@ -1,12 +1,27 @@
 import pandas as pd
+import numpy as np
+import pyarrow.parquet as pq
 from datetime import datetime
 import os
+import glob
+import hashlib
+import heapq
+import json
 from dotenv import load_dotenv
-import google.generativeai as genai
-from openai import OpenAI
 import argparse
+import asyncio
 import logging
+import math
+import random
+import re
 import time
+import tiktoken
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from crypto_cynic_rate_limiter import TokenBucket
+from crypto_cynic_backends import AI_MODELS, MAX_COMPLETION_TOKENS, MODEL_RATE_LIMITS, MODEL_TOKEN_BUDGETS, create_backend
+from crypto_cynic_store import DEFAULT_DB_URL, MessageStore
+from crypto_cynic_metrics import metrics
 
 # Add logging configuration at the top of the script
 logging.basicConfig(
@@ -14,235 +29,994 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
-class CryptoAnalyzer:
-    def __init__(self, ai_service: str, keep_files: bool, timestamp: str):
-        self.ai_service = ai_service.lower()
-        self.keep_files = keep_files
-        self.timestamp = timestamp
-        self.ai_client = self._setup_ai_client()
-        self.max_retries = 3
-        self.retry_delay = 60  # seconds
-        
-        self.crypto_dict = {
-            'bitcoin': 'BTC',
-            'ethereum': 'ETH',
-            'tether': 'USDT',
-            'solana': 'SOL',
-            'bnb': 'BNB',
-            'xrp': 'XRP',
-            'dogecoin': 'DOGE',
-            'usd coin': 'USDC',
-            'cardano': 'ADA',
-            'avalanche': 'AVAX',
-            'tron': 'TRX',
-            'toncoin': 'TON',
-            'polkadot': 'DOT',
-            'chainlink': 'LINK',
-            'bitcoin cash': 'BCH',
-            'litecoin': 'LTC',
-            'stellar': 'XLM',
-            'aptos': 'APT',
-            'hedera': 'HBAR',
-            'internet computer': 'ICP',
-            'dai': 'DAI',
-            'cronos': 'CRO',
-            'pol': 'POL',
-            'ethereum classic': 'ETC',
-            'bittensor': 'TAO',
-            'render': 'RNDR',
-            'kaspa': 'KAS',
-            'arbitrum': 'ARB',
-            'celestia': 'TIA',
-            'vechain': 'VET',
-            'mantra': 'OM',
-            'filecoin': 'FIL',
-            'bonk': 'BONK',
-            'okb': 'OKB',
-            'stacks': 'STX',
-            'cosmos': 'ATOM',
-            'dogwifhat': 'WIF',
-            'fantom': 'FTM',
-            'injective': 'INJ',
-            'monero': 'XMR',
-            'sei': 'SEI',
-            'immutable': 'IMX',
-            'optimism': 'OP',
-            'mantle': 'MNT',
-            'aave': 'AAVE',
-            'algorand': 'ALGO',
-            'the graph': 'GRT',
-            'bitget token': 'BGB',
-            'first digital usd': 'FDUSD',
-            'floki': 'FLOKI',
-            'theta network': 'THETA',
-            'thorchain': 'RUNE',
-            'ethena': 'ENA',
-            'worldcoin': 'WLD',
-            'raydium': 'RAY',
-            'maker': 'MKR',
-            'pyth network': 'PYTH',
-            'the sandbox': 'SAND',
-            'lido dao': 'LDO',
-            'jupiter': 'JUP',
-            'kucoin token': 'KCS',
-            'flow': 'FLOW',
-            'bitcoin sv': 'BSV',
-            'arweave': 'AR',
-            'gala': 'GALA',
-            'polygon': 'MATIC',
-            'eos': 'EOS',
-            'bittorrent': 'BTT',
-            'tezos': 'XTZ',
-            'starknet': 'STRK',
-            'flare': 'FLR',
-            'jasmy': 'JASMY',
-            'quant': 'QNT',
-            'decentraland': 'MANA',
-            'axie infinity': 'AXS',
-            'helium': 'HNT',
-            'multiversx': 'EGLD',
-            'neo': 'NEO',
-            'gatetoken': 'GT',
-            'apecoin': 'APE',
-            'akash network': 'AKT',
-            'dydx': 'DYDX',
-            'ecash': 'XEC',
-            'mina': 'MINA',
-            'nexo': 'NEXO',
-            'xdc network': 'XDC',
-            'chiliz': 'CHZ',
-            'pendle': 'PENDLE',
-            'ordi': 'ORDI',
-            'conflux': 'CFX',
-            'ethereum name service': 'ENS',
-            'iota': 'MIOTA',
-            'zcash': 'ZEC',
-            'usdd': 'USDD',
-            'ftx token': 'FTT',
-            'pancakeswap': 'CAKE',
-            'aelf': 'ELF',
-            '0x protocol': 'ZRX',
-            'arkham': 'ARKM',
-            'woo': 'WOO',
-            'trust wallet token': 'TWT',
-            'reserve rights': 'RSR',
-            'siacoin': 'SC',
-            'basic attention token': 'BAT',
-            'amp': 'AMP',
-            'iotex': 'IOTX',
-            'ankr': 'ANKR',
-            'space id': 'ID',
-            'osmosis': 'OSMO',
-            'dash': 'DASH',
-            'manta network': 'MANTA',
-            'origintrail': 'TRAC',
-            'ethereumpow': 'ETHW',
-            'qtum': 'QTUM',
-            'zetachain': 'ZETA',
-            'just': 'JST',
-            'gas': 'GAS',
-            'baby doge coin': 'BABYDOGE',
-            'creditcoin': 'CTC',
-            'safepal': 'SFP',
-            'ravencoin': 'RVN',
-            'polymesh': 'POLYX',
-            'harmony': 'ONE',
-            'terra': 'LUNA',
-            'mask network': 'MASK',
-            'chia': 'XCH',
-            'threshold': 'T',
-            'peercoin': 'PPC',
-            'gridcoin': 'GRC',
-            'primecoin': 'XPM',
-            'nxt': 'NXT',
-            'auroracoin': 'AUR',
-            'mazacoin': 'MZC',
-            'nervos network': 'CKB',
-            'shiba inu': 'SHIB',
-            'deso': 'DESO',
-            'sui': 'SUI',
-            'pepe': 'PEPE',
-            'near protocol': 'NEAR',
-            'unus sed leo': 'LEO',
-            'uniswap': 'UNI',
-            'wrapped bitcoin': 'WBTC',
-            'wrapped ethereum': 'WETH',
-            'wrapped tron': 'WTRX',
-            'verge': 'XVG',
-            'stellar lumens': 'XLM',
-            'vertcoin': 'VTC',
-            'nano': 'XNO',
-            'firo': 'FIRO',
-            'safemoon': 'SAFEMOON',
-            'ambacoin': 'AMBA',
-            'namecoin': 'NMC'
-        }
+CRYPTO_DICT = {
+    'bitcoin': 'BTC',
+    'ethereum': 'ETH',
+    'tether': 'USDT',
+    'solana': 'SOL',
+    'bnb': 'BNB',
+    'xrp': 'XRP',
+    'dogecoin': 'DOGE',
+    'usd coin': 'USDC',
+    'cardano': 'ADA',
+    'avalanche': 'AVAX',
+    'tron': 'TRX',
+    'toncoin': 'TON',
+    'polkadot': 'DOT',
+    'chainlink': 'LINK',
+    'bitcoin cash': 'BCH',
+    'litecoin': 'LTC',
+    'stellar': 'XLM',
+    'aptos': 'APT',
+    'hedera': 'HBAR',
+    'internet computer': 'ICP',
+    'dai': 'DAI',
+    'cronos': 'CRO',
+    'pol': 'POL',
+    'ethereum classic': 'ETC',
+    'bittensor': 'TAO',
+    'render': 'RNDR',
+    'kaspa': 'KAS',
+    'arbitrum': 'ARB',
+    'celestia': 'TIA',
+    'vechain': 'VET',
+    'mantra': 'OM',
+    'filecoin': 'FIL',
+    'bonk': 'BONK',
+    'okb': 'OKB',
+    'stacks': 'STX',
+    'cosmos': 'ATOM',
+    'dogwifhat': 'WIF',
+    'fantom': 'FTM',
+    'injective': 'INJ',
+    'monero': 'XMR',
+    'sei': 'SEI',
+    'immutable': 'IMX',
+    'optimism': 'OP',
+    'mantle': 'MNT',
+    'aave': 'AAVE',
+    'algorand': 'ALGO',
+    'the graph': 'GRT',
+    'bitget token': 'BGB',
+    'first digital usd': 'FDUSD',
+    'floki': 'FLOKI',
+    'theta network': 'THETA',
+    'thorchain': 'RUNE',
+    'ethena': 'ENA',
+    'worldcoin': 'WLD',
+    'raydium': 'RAY',
+    'maker': 'MKR',
+    'pyth network': 'PYTH',
+    'the sandbox': 'SAND',
+    'lido dao': 'LDO',
+    'jupiter': 'JUP',
+    'kucoin token': 'KCS',
+    'flow': 'FLOW',
+    'bitcoin sv': 'BSV',
+    'arweave': 'AR',
+    'gala': 'GALA',
+    'polygon': 'MATIC',
+    'eos': 'EOS',
+    'bittorrent': 'BTT',
+    'tezos': 'XTZ',
+    'starknet': 'STRK',
+    'flare': 'FLR',
+    'jasmy': 'JASMY',
+    'quant': 'QNT',
+    'decentraland': 'MANA',
+    'axie infinity': 'AXS',
+    'helium': 'HNT',
+    'multiversx': 'EGLD',
+    'neo': 'NEO',
+    'gatetoken': 'GT',
+    'apecoin': 'APE',
+    'akash network': 'AKT',
+    'dydx': 'DYDX',
+    'ecash': 'XEC',
+    'mina': 'MINA',
+    'nexo': 'NEXO',
+    'xdc network': 'XDC',
+    'chiliz': 'CHZ',
+    'pendle': 'PENDLE',
+    'ordi': 'ORDI',
+    'conflux': 'CFX',
+    'ethereum name service': 'ENS',
+    'iota': 'MIOTA',
+    'zcash': 'ZEC',
+    'usdd': 'USDD',
+    'ftx token': 'FTT',
+    'pancakeswap': 'CAKE',
+    'aelf': 'ELF',
+    '0x protocol': 'ZRX',
+    'arkham': 'ARKM',
+    'woo': 'WOO',
+    'trust wallet token': 'TWT',
+    'reserve rights': 'RSR',
+    'siacoin': 'SC',
+    'basic attention token': 'BAT',
+    'amp': 'AMP',
+    'iotex': 'IOTX',
+    'ankr': 'ANKR',
+    'space id': 'ID',
+    'osmosis': 'OSMO',
+    'dash': 'DASH',
+    'manta network': 'MANTA',
+    'origintrail': 'TRAC',
+    'ethereumpow': 'ETHW',
+    'qtum': 'QTUM',
+    'zetachain': 'ZETA',
+    'just': 'JST',
+    'gas': 'GAS',
+    'baby doge coin': 'BABYDOGE',
+    'creditcoin': 'CTC',
+    'safepal': 'SFP',
+    'ravencoin': 'RVN',
+    'polymesh': 'POLYX',
+    'harmony': 'ONE',
+    'terra': 'LUNA',
+    'mask network': 'MASK',
+    'chia': 'XCH',
+    'threshold': 'T',
+    'peercoin': 'PPC',
+    'gridcoin': 'GRC',
+    'primecoin': 'XPM',
+    'nxt': 'NXT',
+    'auroracoin': 'AUR',
+    'mazacoin': 'MZC',
+    'nervos network': 'CKB',
+    'shiba inu': 'SHIB',
+    'deso': 'DESO',
+    'sui': 'SUI',
+    'pepe': 'PEPE',
+    'near protocol': 'NEAR',
+    'unus sed leo': 'LEO',
+    'uniswap': 'UNI',
+    'wrapped bitcoin': 'WBTC',
+    'wrapped ethereum': 'WETH',
+    'wrapped tron': 'WTRX',
+    'verge': 'XVG',
+    'stellar lumens': 'XLM',
+    'vertcoin': 'VTC',
+    'nano': 'XNO',
+    'firo': 'FIRO',
+    'safemoon': 'SAFEMOON',
+    'ambacoin': 'AMBA',
+    'namecoin': 'NMC'
+}
 
-    def _setup_ai_client(self):
-        """Initialize AI client"""
-        load_dotenv()
-        
-        if self.ai_service == 'openai':
-            return OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-        elif self.ai_service == 'gemini':
-            genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
-            return genai.GenerativeModel('gemini-1.5-flash')
-        else:
-            raise ValueError("Invalid AI service")
+def _trie_pattern(words) -> str:
+    """Regex alternation for `words` factored into a character trie.
+    
+    Shared prefixes are matched once, so the engine does not try every word at every
+    position, and optional tails are greedy so the longest word wins.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+    
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return f'(?:{body})?' if '' in node else body
+    
+    return build(trie)
 
-    def analyze_messages(self, messages: list) -> str:
-        """Generate AI analysis of messages with retry logic"""
-        prompt = """Analyze these cryptocurrency messages focusing on:
+# Backends, default models, token budgets and rate limits are registered in crypto_cynic_backends
+CHARS_PER_TOKEN = 4  # fallback estimate when no tokenizer is available
+
+ANALYSIS_PROMPT = """Analyze these cryptocurrency messages focusing on:
         1. Key commercial and technical agreements
         2. Government decisions and regulations
         3. Geopolitical events affecting cryptocurrency
         4. Major market movements
         
         Format the analysis with clear sections."""
+
+MAP_PROMPT = """Summarize the key points of these cryptocurrency messages, one batch out of several:
+        1. Key commercial and technical agreements
+        2. Government decisions and regulations
+        3. Geopolitical events affecting cryptocurrency
+        4. Major market movements
+        
+        Be concise and keep concrete names, figures and dates."""
+
+REDUCE_PROMPT = """Merge these partial analyses of cryptocurrency messages into one analysis focusing on:
+        1. Key commercial and technical agreements
+        2. Government decisions and regulations
+        3. Geopolitical events affecting cryptocurrency
+        4. Major market movements
         
+        Remove repetition and format the analysis with clear sections."""
+
+# AI response cache
+CACHE_DIR = "llm_cache"
+# Chunks end early after a message whose hash hits 1 in N (N scaled to the budget), so
+# overlapping windows produce mostly identical chunks and reuse cached responses
+CHUNK_BOUNDARY_TOKENS = 100
+
+# Engagement-ranked selection of what the AI gets to read
+SELECTION_CHUNKS = 4  # default selection budget, in multiples of the per-call token budget
+SELECTION_CHANNEL_CAP = 25  # messages per channel
+RECENCY_HALF_LIFE_HOURS = 6
+
+MESSAGES_HEADER = "Messages ([xN] marks a message posted N times, e.g. across channels):"
+
+ANALYSIS_FAILED = "Analysis failed due to API limitations. Please try again later."
+
+MENTION_BUCKETS_FILE = "mention_buckets.json"
+MENTION_SEEN_FILE = "mention_buckets_seen.json"  # ids of the messages already counted
+MENTION_BUCKET_MINUTES = 10
+MENTION_RETENTION_DAYS = 14  # twice the longest trend window, so it has a previous period to compare to
+TREND_WINDOWS = {'1h': 1, '24h': 24, '7d': 168}  # label -> hours
+TREND_TOP = 15
+
+# Columns the analysis reads from message files; anything else in an archive is skipped. All are
+# used: channel and message_id key the records, date places them in the window and the recency
+# decay, text is analyzed and views, forwards and replies make up the engagement score
+REPORT_COLUMNS = ['channel', 'message_id', 'date', 'text', 'views', 'forwards', 'replies']
+CSV_DTYPES = {'channel': str, 'message_id': 'int64', 'text': str}
+
+PREPROCESS_MIN_MESSAGES = 20000  # smaller windows are preprocessed inline, a pool costs more than it saves
+PREPROCESS_CHUNK = 2000
+
+class MentionMatcher:
+    """Counts cryptocurrency mentions in a single regex pass per message.
+    
+    Names match case-insensitively as whole words. Symbols match as cashtags in any case
+    ($eth) or as bare uppercase words (ETH), so short symbols like 'T' or 'ONE' don't fire
+    inside ordinary words. Overlapping names resolve to the longest ('bitcoin cash' is not
+    also counted as 'bitcoin').
+    """
+    
+    def __init__(self, crypto_dict: dict):
+        self.names = list(crypto_dict)
+        # Matched text (lowercased, without '$') -> name; the first name listed owns a shared symbol
+        self.lookup = {name: name for name in crypto_dict}
+        for name, symbol in crypto_dict.items():
+            self.lookup.setdefault(symbol.lower(), name)
+        
+        names = _trie_pattern(crypto_dict)
+        symbols = _trie_pattern(set(crypto_dict.values()))
+        self.pattern = re.compile(rf"(?<![\w$'])(?:(?i:{names})|\$(?i:{symbols})|(?:{symbols}))(?!\w)")
+    
+    def mentions_in(self, message: str) -> dict:
+        """Mention counts of a single message, only for the coins it mentions"""
+        mentions = {}
+        for match in self.pattern.finditer(message):
+            name = self.lookup[match.group().lstrip('$').lower()]
+            mentions[name] = mentions.get(name, 0) + 1
+        return mentions
+
+    def count(self, messages: list, weights: list = None) -> dict:
+        mentions = {name: 0 for name in self.names}
+        for index, message in enumerate(messages):
+            if not isinstance(message, str):
+                continue
+            weight = weights[index] if weights else 1
+            for match in self.pattern.finditer(message):
+                mentions[self.lookup[match.group().lstrip('$').lower()]] += weight
+        return mentions
+
+@lru_cache(maxsize=1 << 17)
+def _feature_hash(feature: str) -> int:
+    # blake2b rather than hash(): stable across processes and runs. Bounded, since a daemon's
+    # analyzer sees an open-ended vocabulary of unigrams and bigrams.
+    return int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'big')
+
+class NearDuplicateFilter:
+    """Collapses near-identical messages (cross-posts, lightly edited shills) with MinHash.
+    
+    Each text's set of word unigrams and bigrams gets a signature of `num_hashes` MinHash
+    values; texts whose estimated Jaccard similarity reaches `threshold` collapse. Candidates
+    are found by locality-sensitive hashing: only texts that agree on all values of at least
+    one of `bands` bands of the signature are compared, instead of all pairs.
+    """
+    
+    TOKEN_PATTERN = re.compile(r"\w+")
+    MIN_TOKENS = 5  # shorter texts only collapse when identical after normalization
+    
+    def __init__(self, threshold: float = 0.5, num_hashes: int = 64, bands: int = 16):
+        self.threshold = threshold
+        self.num_hashes = num_hashes
+        self.bands = bands
+        self.rows = num_hashes // bands
+        # Fixed seed: signatures must agree across processes and runs
+        rng = np.random.default_rng(0)
+        self._multipliers = rng.integers(0, 2 ** 63, num_hashes, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._offsets = rng.integers(0, 2 ** 63, num_hashes, dtype=np.uint64)
+
+    def minhash(self, tokens: list) -> np.ndarray:
+        features = set(tokens) | {f"{a} {b}" for a, b in zip(tokens, tokens[1:])}
+        values = np.fromiter((_feature_hash(feature) for feature in features), dtype=np.uint64, count=len(features))
+        # One multiply-add hash function per column (mod 2**64); keep the high 32 bits of each minimum
+        minima = (values[:, None] * self._multipliers + self._offsets).min(axis=0)
+        return (minima >> np.uint64(32)).astype(np.uint32)
+
+    def fingerprint(self, text: str):
+        """Normalized text for short messages (matched exactly), else the MinHash signature; None if empty"""
+        if not isinstance(text, str) or not text.strip():
+            return None
+        tokens = self.TOKEN_PATTERN.findall(text.lower())
+        if len(tokens) < self.MIN_TOKENS:
+            return ' '.join(tokens) or text.strip()
+        return self.minhash(tokens)
+
+    def cluster(self, records: list) -> list:
+        """Keep the first record of each near-duplicate cluster, with the cluster size as 'weight'.
+        
+        Uses a record's precomputed 'fingerprint' when it has one.
+        """
+        representatives = []
+        exact = {}
+        band_index = [{} for _ in range(self.bands)]
+        signatures = []  # of the representatives, indexed by band_index entries
+        min_equal = math.ceil(self.threshold * self.num_hashes)
+        
+        for record in records:
+            fingerprint = record['fingerprint'] if 'fingerprint' in record else self.fingerprint(record.get('text'))
+            if fingerprint is None:
+                continue
+            if isinstance(fingerprint, str):
+                if fingerprint in exact:
+                    exact[fingerprint]['weight'] += 1
+                else:
+                    exact[fingerprint] = dict(record, weight=1)
+                    representatives.append(exact[fingerprint])
+                continue
+            
+            keys = [fingerprint[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+            candidates = set()
+            for band, key in enumerate(keys):
+                candidates.update(band_index[band].get(key, ()))
+            match = None
+            if candidates:
+                # Earliest representative that is similar enough
+                candidates = sorted(candidates)
+                equal = np.count_nonzero(np.stack([signatures[i][0] for i in candidates]) == fingerprint, axis=1)
+                similar = np.flatnonzero(equal >= min_equal)
+                if len(similar):
+                    match = signatures[candidates[similar[0]]][1]
+            
+            if match:
+                match['weight'] += 1
+            else:
+                representative = dict(record, weight=1)
+                representatives.append(representative)
+                for band, key in enumerate(keys):
+                    band_index[band].setdefault(key, []).append(len(signatures))
+                signatures.append((fingerprint, representative))
+        return representatives
+
+def load_encoding(model: str):
+    """tiktoken encoding for the model, or False if it can't be loaded (e.g. offline)"""
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logging.warning(f"tiktoken encoding unavailable ({e}), estimating tokens from text length")
+        return False
+
+def token_count(encoding, text: str) -> int:
+    if not encoding:
+        return len(text) // CHARS_PER_TOKEN + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+# Per-process tables for the preprocessing pool, set once by _init_preprocess
+_preprocess_state = {}
+
+def _init_preprocess(matcher, dedup_filter, model: str, use_tiktoken: bool):
+    # With the fork start method the tables are inherited rather than pickled
+    _preprocess_state['matcher'] = matcher
+    _preprocess_state['dedup_filter'] = dedup_filter
+    _preprocess_state['encoding'] = load_encoding(model) if use_tiktoken else False
+
+def _preprocess_chunk(texts: list) -> list:
+    """(token count, dedup fingerprint, mentions) per text, or None for empty and non-string text"""
+    matcher = _preprocess_state['matcher']
+    dedup_filter = _preprocess_state['dedup_filter']
+    encoding = _preprocess_state['encoding']
+    results = []
+    for text in texts:
+        if not isinstance(text, str) or not text.strip():
+            results.append(None)
+            continue
+        results.append((token_count(encoding, text), dedup_filter.fingerprint(text), matcher.mentions_in(text)))
+    return results
+
+def _retry_after(error) -> float:
+    """Seconds the server asked us to wait, from a Retry-After header if the error carries one"""
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+class AsyncAIClient:
+    """Concurrent AI calls to a registered backend, kept within request and token per-minute quotas.
+    
+    The backend's SDK client, the semaphore and the quota buckets are bound to the running
+    event loop and rebuilt if the client is used from a new one (e.g. successive asyncio.run calls).
+    """
+    
+    def __init__(self, ai_service: str, model: str, concurrency: int = 4, rpm: int = None, tpm: int = None,
+                 max_retries: int = 3, base_delay: float = 2.0, max_delay: float = 60.0):
+        load_dotenv()
+        self.backend = create_backend(ai_service, model)
+        default_rpm, default_tpm = MODEL_RATE_LIMITS[self.backend.model]
+        self.ai_service = ai_service
+        self.model = self.backend.model
+        self.concurrency = concurrency
+        self.rpm = rpm or default_rpm
+        self.tpm = tpm or default_tpm
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._loop = None
+
+    def _bind(self):
+        loop = asyncio.get_running_loop()
+        if loop is self._loop:
+            return
+        self._loop = loop
+        self.backend.bind()
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._requests = TokenBucket(self.rpm / 60, capacity=self.rpm)
+        self._tokens = TokenBucket(self.tpm / 60, capacity=self.tpm)
+
+    async def _stream(self, content: str, on_text, parts: list):
+        """Hand each piece of the backend's streamed text to `on_text` as it arrives, collecting it in `parts`"""
+        started = time.perf_counter()
+        async for text in self.backend.stream(content):
+            if text:
+                if not parts:
+                    metrics.observe('llm_first_token_seconds', time.perf_counter() - started, model=self.model)
+                parts.append(text)
+                on_text(text)
+
+    async def _backoff(self, error: Exception, attempt: int):
+        delay = _retry_after(error)
+        if delay is not None:
+            # The server told us when quota frees up; hold back every other call too
+            self._requests.pause(delay)
+        else:
+            # Exponential backoff with full jitter
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        logging.info(f"Retrying in {delay:.1f} seconds...")
+        await asyncio.sleep(delay)
+
+    async def complete(self, content: str, prompt_tokens: int) -> str:
+        """Run one completion with retries; returns None if every attempt fails"""
+        self._bind()
         for attempt in range(self.max_retries):
-            try:
-                if self.ai_service == 'openai':
-                    response = self.ai_client.chat.completions.create(
-                        model="gpt-3.5-turbo",
-                        messages=[
-                            {"role": "system", "content": "You are a crypto market analyst."},
-                            {"role": "user", "content": f"{prompt}\n\nMessages:\n{messages}"}
-                        ],
-                        max_tokens=1500
-                    )
-                    return response.choices[0].message.content
+            async with self._semaphore:
+                await self._requests.acquire()
+                await self._tokens.acquire(prompt_tokens + MAX_COMPLETION_TOKENS)
+                started = time.perf_counter()
+                try:
+                    response = await self.backend.complete(content)
+                except Exception as e:
+                    error = e
                 else:
-                    response = self.ai_client.generate_content(
-                        f"{prompt}\n\nMessages:\n{messages}"
-                    )
-                    return response.text
-                    
-            except Exception as e:
-                logging.error(f"AI analysis attempt {attempt + 1} failed: {e}")
-                if attempt < self.max_retries - 1:
-                    logging.info(f"Retrying in {self.retry_delay} seconds...")
-                    time.sleep(self.retry_delay)
+                    metrics.observe('llm_call_seconds', time.perf_counter() - started, model=self.model)
+                    metrics.inc('llm_prompt_tokens_total', prompt_tokens, model=self.model)
+                    return response
+            
+            metrics.observe('llm_call_seconds', time.perf_counter() - started, model=self.model, outcome='error')
+            logging.error(f"AI analysis attempt {attempt + 1} failed: {error}")
+            if attempt < self.max_retries - 1:
+                await self._backoff(error, attempt)
+        
+        logging.error("All retry attempts failed")
+        return None
+
+    async def stream(self, content: str, prompt_tokens: int, on_text) -> tuple:
+        """Streaming `complete`: returns (text, finished), text None if every attempt fails.
+        
+        An attempt that fails before any text arrived is retried. Once text has been handed
+        to `on_text` it can't be taken back, so a failure mid-stream returns the partial text.
+        """
+        self._bind()
+        for attempt in range(self.max_retries):
+            parts = []
+            async with self._semaphore:
+                await self._requests.acquire()
+                await self._tokens.acquire(prompt_tokens + MAX_COMPLETION_TOKENS)
+                started = time.perf_counter()
+                try:
+                    await self._stream(content, on_text, parts)
+                except Exception as e:
+                    error = e
                 else:
-                    logging.error("All retry attempts failed")
-                    return "Analysis failed due to API limitations. Please try again later."
+                    metrics.observe('llm_call_seconds', time.perf_counter() - started, model=self.model)
+                    metrics.inc('llm_prompt_tokens_total', prompt_tokens, model=self.model)
+                    return ''.join(parts), True
+            
+            metrics.observe('llm_call_seconds', time.perf_counter() - started, model=self.model, outcome='error')
+            if parts:
+                logging.error(f"AI stream interrupted after {len(parts)} chunks: {error}")
+                return ''.join(parts), False
+            logging.error(f"AI analysis attempt {attempt + 1} failed: {error}")
+            if attempt < self.max_retries - 1:
+                await self._backoff(error, attempt)
+        
+        logging.error("All retry attempts failed")
+        return None, False
+
+class ResponseCache:
+    """Content-addressed on-disk cache of AI responses, evicted least-recently-used by total size"""
+    
+    def __init__(self, directory: str = CACHE_DIR, max_mb: float = 50, ttl_hours: float = None):
+        self.directory = directory
+        self.max_bytes = max_mb * 1024 * 1024
+        self.ttl = ttl_hours * 3600 if ttl_hours else None
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(*parts: str) -> str:
+        return hashlib.sha256('\x00'.join(parts).encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> str:
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        if self.ttl and time.time() - entry['created'] > self.ttl:
+            os.remove(path)
+            self.misses += 1
+            return None
+        # The file's mtime doubles as its last-access time for LRU eviction
+        os.utime(path)
+        self.hits += 1
+        return entry['response']
+
+    def put(self, key: str, response: str):
+        path = self._path(key)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'created': time.time(), 'response': response}, f)
+        os.replace(tmp_path, path)
+        self._evict()
 
-    def count_mentions(self, messages: list) -> dict:
-        """Count cryptocurrency mentions"""
-        mentions = {name: 0 for name in self.crypto_dict.keys()}
+    def _evict(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+class MentionBuckets:
+    """Mention counts per time bucket, channel and coin, persisted between runs.
+    
+    Each message is scanned once, the first time it is seen, so the mention table of any
+    window is a sum over its buckets instead of a rescan of every message text in it.
+    Windows are aligned to bucket boundaries. The ids of the counted messages are kept in
+    a separate file that only `add` loads, so window and trend queries read just the counts.
+    """
+    
+    def __init__(self, path: str = MENTION_BUCKETS_FILE, bucket_minutes: float = MENTION_BUCKET_MINUTES,
+                 retention_days: float = MENTION_RETENTION_DAYS, seen_path: str = MENTION_SEEN_FILE):
+        self.path = path
+        self.seen_path = seen_path
+        self.bucket_seconds = int(bucket_minutes * 60)
+        self.retention = retention_days * 86400
+        # bucket start (epoch seconds) -> {'counts': {channel: {name: count}}}
+        self.buckets = {}
+        # bucket start -> {channel: {message_id}}, or None until `add` needs it
+        self.seen = None
+        self._load()
+
+    def _read(self, path: str) -> dict:
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('bucket_seconds') != self.bucket_seconds:
+            logging.warning(f"{path} uses {data.get('bucket_seconds')}s buckets, starting over with {self.bucket_seconds}s")
+            return None
+        return data
+
+    def _load(self):
+        data = self._read(self.path)
+        if data is None:
+            return
+        legacy_seen = {}
+        for start, bucket in data['buckets'].items():
+            self.buckets[int(start)] = {'counts': bucket['counts']}
+            # Files written before the ids moved out keep them in each bucket as "channel/message_id"
+            if 'seen' in bucket:
+                seen = legacy_seen[int(start)] = {}
+                for key in bucket['seen']:
+                    channel, message_id = key.rsplit('/', 1)
+                    seen.setdefault(channel, set()).add(int(message_id))
+        if legacy_seen:
+            self.seen = legacy_seen
+
+    def _load_seen(self):
+        data = self._read(self.seen_path)
+        seen = {
+            int(start): {channel: set(ids) for channel, ids in channels.items()}
+            for start, channels in (data or {}).get('seen', {}).items()
+        }
+        # Every counted bucket has its ids; a bucket in only one of the files (e.g. after a crash
+        # between the two writes) is dropped so its messages are counted again from scratch
+        self.buckets = {start: bucket for start, bucket in self.buckets.items() if start in seen}
+        self.seen = {start: channels for start, channels in seen.items() if start in self.buckets}
+
+    def save(self):
+        cutoff = time.time() - self.retention
+        self.buckets = {start: bucket for start, bucket in self.buckets.items() if start >= cutoff}
+        if self.seen is not None:
+            self.seen = {start: channels for start, channels in self.seen.items() if start >= cutoff}
+            self._write(self.seen_path, 'seen', {
+                str(start): {channel: sorted(ids) for channel, ids in channels.items()}
+                for start, channels in self.seen.items()
+            })
+        self._write(self.path, 'buckets', {
+            str(start): {'counts': bucket['counts']} for start, bucket in self.buckets.items()
+        })
+
+    def _write(self, path: str, key: str, data: dict):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'bucket_seconds': self.bucket_seconds, key: data}, f)
+        os.replace(tmp_path, path)
+
+    def _bucket(self, timestamp: float) -> int:
+        return int(timestamp // self.bucket_seconds * self.bucket_seconds)
+
+    def add(self, records: list, matcher: MentionMatcher) -> int:
+        """Count mentions of the records not seen before, returning how many were new"""
+        if self.seen is None:
+            self._load_seen()
+        dates = pd.to_datetime([record['date'] for record in records], utc=True, errors='coerce')
+        added = 0
+        for record, date in zip(records, dates):
+            if pd.isna(date):
+                continue
+            start = self._bucket(date.timestamp())
+            bucket = self.buckets.setdefault(start, {'counts': {}})
+            seen = self.seen.setdefault(start, {}).setdefault(record['channel'], set())
+            message_id = int(record['message_id'])
+            if message_id in seen:
+                continue
+            seen.add(message_id)
+            added += 1
+            if not isinstance(record['text'], str):
+                continue
+            mentions = record['mentions'] if 'mentions' in record else matcher.mentions_in(record['text'])
+            if mentions:
+                counts = bucket['counts'].setdefault(record['channel'], {})
+                for name, count in mentions.items():
+                    counts[name] = counts.get(name, 0) + count
+        return added
+
+    def window(self, start: float, end: float = None, channels: set = None) -> dict:
+        """Mentions per coin in the buckets from `start` up to `end` (epoch seconds, default: now)"""
+        first = self._bucket(start)
+        last = self._bucket(end) if end is not None else None
+        totals = {}
+        for bucket_start, bucket in self.buckets.items():
+            if bucket_start < first or (last is not None and bucket_start >= last):
+                continue
+            for channel, counts in bucket['counts'].items():
+                if channels is None or channel in channels:
+                    for name, count in counts.items():
+                        totals[name] = totals.get(name, 0) + count
+        return totals
+
+    def trends(self, now: float = None) -> dict:
+        """Per trend window: (mentions in the window, mentions in the window before it)"""
+        now = now or time.time()
+        return {
+            label: (self.window(now - hours * 3600), self.window(now - 2 * hours * 3600, now - hours * 3600))
+            for label, hours in TREND_WINDOWS.items()
+        }
+
+def format_trends(trends: dict, crypto_dict: dict = CRYPTO_DICT) -> list:
+    """One line per top coin: mentions per trend window and the change from the window before"""
+    latest = trends[next(iter(trends))][0]
+    longest = trends[list(trends)[-1]][0]
+    top = sorted(longest, key=lambda name: (latest.get(name, 0), longest[name]), reverse=True)[:TREND_TOP]
+    lines = []
+    for name in top:
+        windows = ' | '.join(
+            f"{label} {current.get(name, 0)} ({current.get(name, 0) - previous.get(name, 0):+d})"
+            for label, (current, previous) in trends.items()
+        )
+        lines.append(f"{name.upper()} ({crypto_dict[name]}): {windows}")
+    return lines
+
+class CryptoAnalyzer:
+    def __init__(self, ai_service: str, keep_files: bool, timestamp: str, token_budget: int = None,
+                 concurrency: int = 4, rpm: int = None, tpm: int = None, use_cache: bool = True,
+                 cache_max_mb: float = 50, cache_ttl_hours: float = None, dedup: bool = True,
+                 selection_tokens: int = None, channel_cap: int = SELECTION_CHANNEL_CAP,
+                 use_buckets: bool = True, bucket_minutes: float = MENTION_BUCKET_MINUTES,
+                 processes: int = None, stream: bool = False, stream_stdout: bool = False):
+        self.ai_service = ai_service.lower()
+        self.keep_files = keep_files
+        self.timestamp = timestamp
+        self.model = AI_MODELS.get(self.ai_service)
+        self.max_retries = 3
+        self.ai_client = self._setup_ai_client(concurrency, rpm, tpm)
+        self.token_budget = token_budget or MODEL_TOKEN_BUDGETS[self.model]
+        self._encoding = None
+        self.cache = ResponseCache(CACHE_DIR, cache_max_mb, cache_ttl_hours) if use_cache else None
+        self.dedup_filter = NearDuplicateFilter() if dedup else None
+        self.selection_tokens = selection_tokens or SELECTION_CHUNKS * self.token_budget
+        self.channel_cap = channel_cap
+        self.processes = processes or os.cpu_count() or 1
+        self._pool = None  # preprocessing ProcessPoolExecutor, started on first use
+        self.stream = stream or stream_stdout
+        self.stream_stdout = stream_stdout
         
-        for message in messages:
-            if not isinstance(message, str):
+        self.crypto_dict = CRYPTO_DICT
+        self.mention_matcher = MentionMatcher(self.crypto_dict)
+        self.mention_buckets = MentionBuckets(bucket_minutes=bucket_minutes) if use_buckets else None
+
+    def _setup_ai_client(self, concurrency: int, rpm: int, tpm: int):
+        """Initialize AI client"""
+        return AsyncAIClient(self.ai_service, self.model, concurrency, rpm, tpm, self.max_retries)
+
+    def _get_encoding(self):
+        """tiktoken encoding for the model, or False if it can't be loaded (e.g. offline)"""
+        if self._encoding is None:
+            self._encoding = load_encoding(self.model)
+        return self._encoding
+
+    def count_tokens(self, text: str) -> int:
+        """Token count used for budgeting (tiktoken; an approximation for Gemini)"""
+        return token_count(self._get_encoding(), text)
+
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        encoding = self._get_encoding()
+        if not encoding:
+            return text[:max_tokens * CHARS_PER_TOKEN]
+        return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+
+    def _pack(self, texts: list, budget: int, content_defined: bool = False) -> list:
+        """Greedily pack texts into newline-joined chunks of at most `budget` tokens.
+        
+        With `content_defined`, a chunk also ends after any text whose hash selects it as a
+        boundary, so dropping or adding texts only changes the chunks around them.
+        """
+        boundary_every = max(1, budget // CHUNK_BOUNDARY_TOKENS)
+        chunks = []
+        current, current_tokens = [], 0
+        for text in texts:
+            tokens = self.count_tokens(text) + 1  # + the joining newline
+            if tokens > budget:
+                text, tokens = self._truncate(text, budget - 1), budget
+            if current and current_tokens + tokens > budget:
+                chunks.append("\n".join(current))
+                current, current_tokens = [], 0
+            current.append(text)
+            current_tokens += tokens
+            if content_defined and int(hashlib.md5(text.encode('utf-8')).hexdigest()[:8], 16) % boundary_every == 0:
+                chunks.append("\n".join(current))
+                current, current_tokens = [], 0
+        if current:
+            chunks.append("\n".join(current))
+        return chunks
+
+    async def _complete(self, content: str, on_text=None) -> str:
+        """Send one prompt to the AI service; returns None if every attempt fails.
+        
+        With `on_text`, the response is streamed to it as it arrives (a cached one all at once).
+        """
+        key = ResponseCache.key(self.ai_service, self.model, content) if self.cache else None
+        response = self.cache.get(key) if self.cache else None
+        if response is not None:
+            metrics.inc('llm_cache_hits_total', model=self.model)
+            if on_text:
+                on_text(response)
+            return response
+        finished = True
+        if on_text:
+            response, finished = await self.ai_client.stream(content, self.count_tokens(content), on_text)
+            if response and not finished:
+                on_text("\n[Summary interrupted before the end]")
+        else:
+            response = await self.ai_client.complete(content, self.count_tokens(content))
+        if response:
+            metrics.inc('llm_completion_tokens_total', self.count_tokens(response), model=self.model)
+            # An interrupted stream is kept in the report but never cached
+            if self.cache and finished:
+                self.cache.put(key, response)
+        return response
+
+    async def analyze_messages_async(self, messages: list, on_text=None) -> str:
+        """Async analysis; chunk and reduce calls run concurrently within the AI quotas.
+        
+        With `on_text`, the final call's response is streamed to it.
+        """
+        summary = await self._map_reduce(messages, on_text)
+        if self.cache:
+            logging.info(f"AI response cache: {self.cache.hits} hits, {self.cache.misses} misses")
+        return summary
+
+    async def _map_reduce(self, messages: list, on_text=None) -> str:
+        # One message per line; drops the quotes, escapes and nan entries of a list repr
+        texts = [' '.join(message.split()) for message in messages if isinstance(message, str) and message.strip()]
+        budget = self.token_budget - self.count_tokens(f"{MAP_PROMPT}\n\n{MESSAGES_HEADER}\n")
+        chunks = self._pack(texts, budget, content_defined=True)
+        if not chunks:
+            return ""
+        
+        if len(chunks) == 1:
+            summary = await self._complete(f"{ANALYSIS_PROMPT}\n\n{MESSAGES_HEADER}\n{chunks[0]}", on_text)
+            return summary or ANALYSIS_FAILED
+        
+        logging.info(f"Analyzing {len(texts)} messages in {len(chunks)} chunks of up to {budget} tokens")
+        summaries = await asyncio.gather(*(
+            self._complete(f"{MAP_PROMPT}\n\n{MESSAGES_HEADER}\n{chunk}") for chunk in chunks
+        ))
+        summaries = [summary for summary in summaries if summary]
+        
+        # Reduce partial analyses until they fit in one final call
+        budget = self.token_budget - self.count_tokens(f"{REDUCE_PROMPT}\n\nPartial analyses:\n")
+        while summaries:
+            groups = self._pack(summaries, budget)
+            if len(groups) == 1:
+                summary = await self._complete(f"{REDUCE_PROMPT}\n\nPartial analyses:\n{groups[0]}", on_text)
+                return summary or ANALYSIS_FAILED
+            if len(groups) == len(summaries):
+                return "\n\n".join(summaries)
+            summaries = await asyncio.gather(*(
+                self._complete(f"{REDUCE_PROMPT}\n\nPartial analyses:\n{group}") for group in groups
+            ))
+            summaries = [summary for summary in summaries if summary]
+        return ANALYSIS_FAILED
+
+    def analyze_messages(self, messages: list) -> str:
+        """Generate AI analysis of messages, map-reducing over chunks that fit the token budget"""
+        return asyncio.run(self.analyze_messages_async(messages))
+
+    @staticmethod
+    def _engagement(record: dict) -> float:
+        """Log-scaled engagement; forwards and replies say more than passive views"""
+        def number(key):
+            value = record.get(key)
+            return 0 if value is None or value != value else max(float(value), 0)  # NaN from CSV
+        engagement = math.log1p(number('views')) + 2 * math.log1p(number('forwards')) + 3 * math.log1p(number('replies'))
+        # A message pushed by many channels matters more than any single copy's numbers
+        return (1 + engagement) * (1 + math.log(record.get('weight', 1)))
+
+    def select_messages(self, records: list) -> tuple:
+        """Pick the highest-scoring messages that fit the selection token budget.
+        
+        Score is engagement decayed by age, with at most `channel_cap` messages per channel.
+        Returns the selected records (oldest first) and selection counts for the report.
+        """
+        records = [record for record in records if isinstance(record.get('text'), str) and record['text'].strip()]
+        dates = pd.to_datetime(pd.Series([record.get('date') for record in records], dtype=object),
+                               utc=True, errors='coerce')
+        now = pd.Timestamp.now(tz='UTC')
+        
+        heap = []
+        for index, (record, date) in enumerate(zip(records, dates)):
+            age_hours = 0 if pd.isna(date) else max((now - date).total_seconds() / 3600, 0)
+            score = self._engagement(record) * 0.5 ** (age_hours / RECENCY_HALF_LIFE_HOURS)
+            heap.append((-score, index, record))
+        heapq.heapify(heap)
+        
+        # Pop in score order only as far as the budget reaches
+        selected, per_channel = [], {}
+        tokens = capped = 0
+        while heap:
+            _, _, record = heapq.heappop(heap)
+            channel = record.get('channel')
+            if per_channel.get(channel, 0) >= self.channel_cap:
+                capped += 1
                 continue
-            
-            message = message.lower()
-            for name, symbol in self.crypto_dict.items():
-                mentions[name] += message.count(name)
-                mentions[name] += message.count(symbol.lower())
+            cost = (record['tokens'] if 'tokens' in record else self.count_tokens(record['text'])) + 1
+            if tokens + cost > self.selection_tokens:
+                break
+            selected.append(record)
+            per_channel[channel] = per_channel.get(channel, 0) + 1
+            tokens += cost
         
-        return mentions
+        stats = {
+            'candidates': len(records),
+            'selected': len(selected),
+            'channels': len(per_channel),
+            'skipped_channel_cap': capped,
+            'tokens': tokens,
+            'token_budget': self.selection_tokens
+        }
+        selected.sort(key=lambda record: str(record['date']))
+        return selected, stats
+
+    def _preprocess_pool(self) -> ProcessPoolExecutor:
+        """The preprocessing pool, kept for the analyzer's lifetime so daemon runs reuse its workers"""
+        if self._pool is None:
+            initargs = (self.mention_matcher, self.dedup_filter or NearDuplicateFilter(), self.model,
+                        bool(self._get_encoding()))
+            self._pool = ProcessPoolExecutor(self.processes, initializer=_init_preprocess, initargs=initargs)
+        return self._pool
+
+    async def preprocess(self, records: list) -> list:
+        """Copies of the records with 'tokens', 'fingerprint' and 'mentions' computed in a process pool.
+        
+        Chunks come back in order, so the result is the same as computing them inline.
+        Records without usable text are dropped. The event loop keeps running meanwhile.
+        """
+        texts = [record.get('text') for record in records]
+        chunks = [texts[start:start + PREPROCESS_CHUNK] for start in range(0, len(texts), PREPROCESS_CHUNK)]
+        pool = self._preprocess_pool()
+        loop = asyncio.get_running_loop()
+        with metrics.timer('stage_seconds', stage='preprocess'):
+            done = await asyncio.gather(*(loop.run_in_executor(pool, _preprocess_chunk, chunk) for chunk in chunks))
+        results = [result for chunk in done for result in chunk]
+        logging.info(f"Preprocessed {len(records)} messages in {len(chunks)} chunks on {self.processes} processes")
+        return [
+            dict(record, tokens=result[0], fingerprint=result[1], mentions=result[2])
+            for record, result in zip(records, results) if result is not None
+        ]
+
+    def count_mentions(self, messages: list, weights: list = None) -> dict:
+        """Count cryptocurrency mentions, each message counted `weight` times when given"""
+        with metrics.timer('mention_count_seconds', method='scan'):
+            return self.mention_matcher.count(messages, weights)
 
-    def generate_report(self, summary: str, mentions: dict) -> str:
+    def window_mentions(self, records: list) -> dict:
+        """Mentions over the records' time window, summed from the mention buckets"""
+        with metrics.timer('mention_count_seconds', method='buckets'):
+            added = self.mention_buckets.add(records, self.mention_matcher)
+            self.mention_buckets.save()
+        logging.info(f"Counted mentions in {added} new of {len(records)} messages")
+        dates = pd.to_datetime([record['date'] for record in records], utc=True, errors='coerce')
+        # Up to and including the newest record's bucket, so later runs' counts stay out of older reports
+        end = dates.max().timestamp() + self.mention_buckets.bucket_seconds
+        totals = self.mention_buckets.window(dates.min().timestamp(), end,
+                                             channels={record['channel'] for record in records})
+        metrics.inc('mention_messages_scanned_total', added)
+        return {name: totals.get(name, 0) for name in self.crypto_dict}
+
+    def _write_selection(self, f, stats: dict):
+        f.write("MESSAGE SELECTION\n")
+        f.write("-" * 20 + "\n")
+        for key, value in stats.items():
+            f.write(f"{key.replace('_', ' ').capitalize()}: {value}\n")
+        f.write("\n")
+
+    def _write_mentions(self, f, mentions: dict, trends: dict = None):
+        f.write("CRYPTOCURRENCY MENTIONS\n")
+        f.write("-" * 20 + "\n")
+        for crypto, count in sorted(mentions.items(), key=lambda x: x[1], reverse=True):
+            f.write(f"{crypto.upper()} ({self.crypto_dict[crypto]}): {count} mentions\n")
+        
+        if trends:
+            f.write("\nMENTION TRENDS (change vs. the previous period)\n")
+            f.write("-" * 20 + "\n")
+            for line in format_trends(trends, self.crypto_dict):
+                f.write(line + "\n")
+
+    def generate_report(self, summary: str, mentions: dict, stats: dict = None, trends: dict = None) -> str:
         """Generate analysis report"""
         report_file = f"crypto_analysis_{self.timestamp}.txt"
         
@@ -255,58 +1029,224 @@ class CryptoAnalyzer:
                 f.write("-" * 20 + "\n")
                 f.write(summary + "\n\n")
             
-            f.write("CRYPTOCURRENCY MENTIONS\n")
+            if stats:
+                self._write_selection(f, stats)
+            
+            self._write_mentions(f, mentions, trends)
+        
+        return report_file
+
+    async def stream_report(self, messages: list, mentions: dict, stats: dict = None, trends: dict = None) -> str:
+        """Write the report progressively: mentions and selection first, then the summary as it streams.
+        
+        Every piece of summary text is flushed to disk on arrival (and echoed to stdout with
+        `stream_stdout`), so an interrupted analysis still leaves what was generated.
+        """
+        report_file = f"crypto_analysis_{self.timestamp}.txt"
+        
+        with open(report_file, 'w', encoding='utf-8') as f:
+            f.write(f"Cryptocurrency Analysis Report - {datetime.now()}\n")
+            f.write("=" * 50 + "\n\n")
+            self._write_mentions(f, mentions, trends)
+            f.write("\n")
+            if stats:
+                self._write_selection(f, stats)
+            f.write("ANALYSIS SUMMARY\n")
             f.write("-" * 20 + "\n")
-            for crypto, count in sorted(mentions.items(), key=lambda x: x[1], reverse=True):
-                f.write(f"{crypto.upper()} ({self.crypto_dict[crypto]}): {count} mentions\n")
+            f.flush()
+            
+            streamed = []
+            def on_text(text):
+                streamed.append(text)
+                f.write(text)
+                f.flush()
+                if self.stream_stdout:
+                    print(text, end='', flush=True)
+            
+            summary = await self.analyze_messages_async(messages, on_text)
+            # Failures and unreduced partial analyses come back without being streamed
+            if not streamed and summary:
+                on_text(summary)
+            f.write("\n")
+            if self.stream_stdout:
+                print()
+        
+        return report_file
+
+    def load_records(self) -> list:
+        """Read the scraper's CSV or Parquet files for this timestamp into message records.
+        
+        Only REPORT_COLUMNS are read; Parquet files are memory-mapped and keep their types.
+        The files stay columnar until the copies of a message in several category files are
+        dropped, so only one record per message is built.
+        """
+        frames = []
+        for file in self.message_files():
+            if file.endswith('.parquet'):
+                frames.append(pq.read_table(file, columns=REPORT_COLUMNS, memory_map=True).to_pandas())
+            else:
+                frames.append(pd.read_csv(file, usecols=lambda column: column in REPORT_COLUMNS, dtype=CSV_DTYPES))
+        if not frames:
+            return []
+        frame = pd.concat(frames, ignore_index=True).drop_duplicates(['channel', 'message_id'])
+        return frame.to_dict('records')
+
+    def analyze_records(self, records: list) -> str:
+        """Analyze scraped message records and write the report, returning its path"""
+        return asyncio.run(self.analyze_records_async(records))
+
+    async def analyze_records_async(self, records: list) -> str:
+        """Async version of analyze_records, for callers already running an event loop"""
+        # A channel in several categories appears once per category file
+        unique = {}
+        for record in records:
+            unique.setdefault((record['channel'], record['message_id']), record)
+        # Oldest first, so overlapping windows share their chunks (and cached AI responses)
+        records = sorted(unique.values(), key=lambda record: str(record['date']))
+        stats = {'messages': len(records)}
+        preprocessed = self.processes > 1 and len(records) >= PREPROCESS_MIN_MESSAGES
+        if preprocessed:
+            records = await self.preprocess(records)
+        mentions = self.window_mentions(records) if self.mention_buckets and records else None
+        
+        if self.dedup_filter:
+            with metrics.timer('stage_seconds', stage='near_duplicate_filter'):
+                records = self.dedup_filter.cluster(records)
+            stats['after_near_duplicate_filter'] = len(records)
+            logging.info(f"Near-duplicate filter kept {len(records)} of {stats['messages']} messages")
+        all_messages = [record['text'] for record in records]
+        weights = [record.get('weight', 1) for record in records]
+        
+        if not all_messages:
+            logging.error("No messages found")
+            return None
+
+        with metrics.timer('stage_seconds', stage='selection'):
+            selected, selection_stats = self.select_messages(records)
+        stats.update(selection_stats)
+        logging.info(f"Selected {stats['selected']} of {stats['candidates']} messages "
+                     f"({stats['tokens']} tokens) for AI analysis")
         
+        trends = None
+        if mentions is None and preprocessed:
+            mentions = {name: 0 for name in self.crypto_dict}
+            for record in records:
+                for name, count in record['mentions'].items():
+                    mentions[name] += count * record.get('weight', 1)
+        elif mentions is None:
+            mentions = self.count_mentions(all_messages, weights)
+        else:
+            trends = self.mention_buckets.trends()
+        
+        # The AI sees one copy of each cluster, marked with how often it was posted
+        texts = [
+            record['text'] if record.get('weight', 1) == 1 else f"[x{record['weight']}] {record['text']}"
+            for record in selected
+        ]
+        if self.stream:
+            with metrics.timer('stage_seconds', stage='ai_analysis'):
+                report_file = await self.stream_report(texts, mentions, stats, trends)
+        else:
+            with metrics.timer('stage_seconds', stage='ai_analysis'):
+                summary = await self.analyze_messages_async(texts)
+            with metrics.timer('stage_seconds', stage='report'):
+                report_file = self.generate_report(summary, mentions, stats, trends)
+        metrics.inc('reports_total')
+        
+        logging.info(f"Analysis saved to {report_file}")
         return report_file
 
+    def message_files(self) -> list:
+        """Per-category CSV or Parquet files written by the scraper for this timestamp"""
+        return sorted(glob.glob(f"crypto_*_messages_{self.timestamp}.csv") +
+                      glob.glob(f"crypto_*_messages_{self.timestamp}.parquet"))
+
     def cleanup_files(self):
-        """Clean up CSV files if not keeping them"""
+        """Clean up message files if not keeping them"""
         if not self.keep_files:
-            for prefix in ['crypto_trading_messages_', 'crypto_news_messages_']:
-                filename = f"{prefix}{self.timestamp}.csv"
-                if os.path.exists(filename):
-                    os.remove(filename)
-                    logging.info(f"Removed {filename}")
+            for filename in self.message_files():
+                os.remove(filename)
+                logging.info(f"Removed {filename}")
+
+    def close(self):
+        """Stop the preprocessing pool's worker processes"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
 
 def main():
     parser = argparse.ArgumentParser(description='Crypto News Analysis Tool')
-    parser.add_argument('--ai', choices=['openai', 'gemini'], default='openai',
-                       help='Choose AI service')
+    parser.add_argument('--ai', choices=list(AI_MODELS), default='openai',
+                       help='Choose AI service (extractive: offline summary, no API key needed)')
     parser.add_argument('--keep_files', action='store_true',
                        help='Keep CSV files after analysis')
-    parser.add_argument('--timestamp', required=True,
-                       help='Timestamp for CSV files')
+    parser.add_argument('--timestamp',
+                       help='Timestamp for CSV files (required unless --trends or --db)')
+    parser.add_argument('--db', nargs='?', const=DEFAULT_DB_URL,
+                       help=f'Analyze the last --hours of messages from a database instead of CSV files '
+                            f'(SQLAlchemy URL, default: {DEFAULT_DB_URL})')
+    parser.add_argument('--hours', type=float, default=1,
+                       help='Hours of messages to analyze with --db (default: 1)')
+    parser.add_argument('--processes', type=int,
+                       help=f'Processes for preprocessing windows of {PREPROCESS_MIN_MESSAGES}+ messages '
+                            f'(default: all cores, 1 to disable)')
+    parser.add_argument('--stream', action='store_true',
+                       help='Stream the summary into the report as it is generated, after the mention table')
+    parser.add_argument('--stream_stdout', action='store_true',
+                       help='Like --stream, and also print the summary as it arrives')
+    parser.add_argument('--metrics',
+                       help='Write run metrics to this file: JSON if it ends in .json, else Prometheus text')
+    parser.add_argument('--token_budget', type=int,
+                       help='Prompt tokens per AI call; larger inputs are summarized in chunks (default: per model)')
+    parser.add_argument('--concurrency', type=int, default=4,
+                       help='Maximum AI calls in flight (default: 4)')
+    parser.add_argument('--rpm', type=int,
+                       help='AI requests per minute allowed by your account (default: per model)')
+    parser.add_argument('--tpm', type=int,
+                       help='AI tokens per minute allowed by your account (default: per model)')
+    parser.add_argument('--no_cache', action='store_true',
+                       help=f'Always call the AI service instead of reusing responses cached in {CACHE_DIR}/')
+    parser.add_argument('--cache_max_mb', type=float, default=50,
+                       help='Size limit of the AI response cache in MB (default: 50)')
+    parser.add_argument('--cache_ttl', type=float,
+                       help='Hours a cached AI response stays valid (default: no expiry)')
+    parser.add_argument('--no_dedup', action='store_true',
+                       help='Send near-duplicate messages to the AI instead of one weighted copy')
+    parser.add_argument('--selection_tokens', type=int,
+                       help=f'Tokens of top-ranked messages sent to the AI (default: {SELECTION_CHUNKS}x the token budget)')
+    parser.add_argument('--channel_cap', type=int, default=SELECTION_CHANNEL_CAP,
+                       help=f'Most messages per channel sent to the AI (default: {SELECTION_CHANNEL_CAP})')
+    parser.add_argument('--no_buckets', action='store_true',
+                       help=f'Rescan message texts for the mention table instead of keeping counts in {MENTION_BUCKETS_FILE}')
+    parser.add_argument('--bucket_minutes', type=float, default=MENTION_BUCKET_MINUTES,
+                       help=f'Width of the mention count buckets in minutes (default: {MENTION_BUCKET_MINUTES})')
+    parser.add_argument('--trends', action='store_true',
+                       help=f'Print {"/".join(TREND_WINDOWS)} mention trends from {MENTION_BUCKETS_FILE} and exit')
     args = parser.parse_args()
+    if args.trends:
+        for line in format_trends(MentionBuckets(bucket_minutes=args.bucket_minutes).trends()):
+            print(line)
+        return
+    if not args.timestamp and not args.db:
+        parser.error('--timestamp is required')
 
     try:
-        analyzer = CryptoAnalyzer(args.ai, args.keep_files, args.timestamp)
-        
-        # Read CSV files
-        trading_file = f"crypto_trading_messages_{args.timestamp}.csv"
-        news_file = f"crypto_news_messages_{args.timestamp}.csv"
-        
-        all_messages = []
-        for file in [trading_file, news_file]:
-            if os.path.exists(file):
-                df = pd.read_csv(file)
-                all_messages.extend(df['text'].tolist())
-        
-        if not all_messages:
-            logging.error("No messages found")
-            return
-
-        summary = analyzer.analyze_messages(all_messages)
-        mentions = analyzer.count_mentions(all_messages)
-        report_file = analyzer.generate_report(summary, mentions)
-        
-        logging.info(f"Analysis saved to {report_file}")
-        analyzer.cleanup_files()
+        timestamp = args.timestamp or datetime.now().strftime("%Y%m%d_%H%M%S")
+        analyzer = CryptoAnalyzer(args.ai, args.keep_files, timestamp, args.token_budget,
+                                  args.concurrency, args.rpm, args.tpm, not args.no_cache,
+                                  args.cache_max_mb, args.cache_ttl, not args.no_dedup,
+                                  args.selection_tokens, args.channel_cap, not args.no_buckets,
+                                  args.bucket_minutes, args.processes, args.stream, args.stream_stdout)
+        if args.db:
+            analyzer.analyze_records(MessageStore(args.db).window(args.hours))
+        elif analyzer.analyze_records(analyzer.load_records()):
+            analyzer.cleanup_files()
+        analyzer.close()
         
     except Exception as e:
         logging.error(f"Analysis failed: {e}")
+    if args.metrics:
+        metrics.export(args.metrics)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
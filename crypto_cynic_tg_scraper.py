@@ -1,14 +1,26 @@
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import asyncio
 import time
-from telethon import TelegramClient
+from telethon import TelegramClient, events
+from telethon.errors import FloodWaitError, TakeoutInitDelayError
+from telethon import utils as tg_utils
+from telethon.tl.types import InputPeerChannel, InputPeerChat, InputPeerUser
 import os
 from dotenv import load_dotenv
 import logging
-from datetime import datetime, timedelta
+import json
+import hashlib
+from collections import deque
+from contextlib import AsyncExitStack
+from datetime import datetime, timedelta, timezone
 import argparse
-import subprocess
 from pathlib import Path
+from crypto_cynic_rate_limiter import TokenBucket
+from crypto_cynic_store import DEFAULT_DB_URL, MessageStore
+from crypto_cynic_metrics import metrics
+from crypto_cynic_backends import AI_MODELS
 
 # Python 3.10 recommended - python crypto_cynic_tg_scraper.py --ai gemini --keep_files.py
 # Configure logging
@@ -26,365 +38,1109 @@ SESSION_FILE = "telegram_scraper.session"
 session_path = Path(SESSION_FILE)
 os.environ['SESSION_FILE'] = str(session_path)
 
-async def get_client(api_id, api_hash, phone):
+# Channel registry: username -> categories (trading, news, ...)
+CHANNELS_FILE = "channels.json"
+
+# Telegram returns history in pages of 100 messages, one request per page
+MESSAGES_PER_REQUEST = 100
+# iter_dialogs fetches dialogs in pages of this many
+DIALOGS_PER_REQUEST = 100
+MAX_FLOOD_RETRIES = 5
+
+# Incremental scraping state
+CHECKPOINT_FILE = "scraper_checkpoints.json"
+HISTORY_FILE = "crypto_message_history.csv"
+
+# Resumable backfill (--backfill): page cursors and, without --db, the output file
+BACKFILL_STATE_FILE = "backfill_state.json"
+BACKFILL_FILE = "crypto_backfill_messages.csv"
+BACKFILL_PAGE_SIZE = 1000
+
+# Resolved username -> peer cache
+ENTITY_CACHE_FILE = "entity_cache.json"
+ENTITY_CACHE_TTL_HOURS = 7 * 24
+
+# Typed, compressed columnar output (--format parquet)
+PARQUET_SCHEMA = pa.schema([
+    ('channel', pa.string()),
+    ('message_id', pa.int64()),
+    ('date', pa.timestamp('us', tz='UTC')),
+    ('text', pa.string()),
+    ('views', pa.int64()),
+    ('forwards', pa.int64()),
+    ('replies', pa.int64())
+])
+PARQUET_COMPRESSION = 'zstd'
+
+def load_channel_registry(path: str = CHANNELS_FILE) -> dict:
+    """Load the channel registry, merging usernames that differ only in case"""
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+    
+    registry = {}
+    spellings = {}
+    for username, categories in config['channels'].items():
+        if isinstance(categories, str):
+            categories = [categories]
+        # Telegram usernames are case-insensitive, keep the first spelling seen
+        username = spellings.setdefault(username.lower(), username)
+        merged = registry.setdefault(username, [])
+        merged.extend(category for category in categories if category not in merged)
+    return registry
+
+def split_by_category(messages: list, registry: dict) -> dict:
+    """Group scraped messages by the categories of their channel"""
+    categories = {}
+    for message in messages:
+        for category in registry.get(message['channel'], []):
+            categories.setdefault(category, []).append(message)
+    return categories
+
+def message_record(message, channel_username: str) -> dict:
+    """The record format shared by history scraping and live ingestion"""
+    return {
+        'channel': channel_username,
+        'message_id': message.id,
+        'date': message.date,
+        'text': message.text,
+        'views': getattr(message, 'views', 0),
+        'forwards': getattr(message, 'forwards', 0),
+        'replies': getattr(message.replies, 'replies', 0) if message.replies else 0
+    }
+
+async def get_client(api_id, api_hash, phone, sequential_updates: bool = False, session: str = SESSION_FILE):
     """Initialize Telegram client with auto-generated session file"""
-    client = TelegramClient(SESSION_FILE, api_id, api_hash)
+    # Sequential updates make a slow event handler hold back Telegram's update stream
+    client = TelegramClient(session, api_id, api_hash, sequential_updates=sequential_updates)
+    # Surface every FloodWait so the shared limiter can back off all workers at once
+    client.flood_sleep_threshold = 0
     await client.start(phone=phone)
     return client
 
-async def scrape_channel(client, channel_username, hours_back):
-    """Scrape messages from a channel"""
-    try:
-        channel = await client.get_entity(channel_username)
-        messages = []
-        cutoff_time = datetime.now() - timedelta(hours=hours_back)
-        
-        async for message in client.iter_messages(channel, offset_date=cutoff_time):
-            message_data = {
-                'channel': channel_username,
-                'message_id': message.id,
-                'date': message.date,
-                'text': message.text,
-                'views': getattr(message, 'views', 0),
-                'forwards': getattr(message, 'forwards', 0),
-                'replies': getattr(message.replies, 'replies', 0) if message.replies else 0
-            }
-            messages.append(message_data)
+class CheckpointStore:
+    """Persisted per-channel high-water marks (last message_id seen)"""
+    
+    def __init__(self, path: str = CHECKPOINT_FILE):
+        self.path = Path(path)
+        self.checkpoints = {}
+        self.staged = {}
+        if self.path.exists():
+            try:
+                self.checkpoints = json.loads(self.path.read_text(encoding='utf-8'))
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable checkpoint file {self.path}: {e}")
+    
+    def get(self, channel: str) -> int:
+        return self.checkpoints.get(channel, 0)
+    
+    def stage(self, channel: str, message_id: int):
+        """Record a fully scraped channel's newest message, pending the next commit"""
+        self.staged[channel] = max(self.staged.get(channel, 0), int(message_id))
+    
+    def commit(self):
+        """Advance staged high-water marks once their messages are safely written"""
+        for channel, message_id in self.staged.items():
+            self.checkpoints[channel] = max(self.get(channel), message_id)
+        self.staged = {}
+        self.save()
+    
+    def save(self):
+        write_json_atomic(self.path, self.checkpoints)
+
+class BackfillState:
+    """Persisted per-channel backfill jobs: how far back to go and the page cursor reached.
+    
+    A channel's cursor (`offset_id`, the oldest message written so far) is saved after
+    every page, so an interrupted backfill resumes at the page it stopped in.
+    """
+    
+    def __init__(self, path: str = BACKFILL_STATE_FILE):
+        self.path = Path(path)
+        self.jobs = {}
+        if self.path.exists():
+            try:
+                self.jobs = json.loads(self.path.read_text(encoding='utf-8'))
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable backfill state {self.path}: {e}")
+    
+    def start(self, channel: str, cutoff: float) -> dict:
+        """The channel's job, created or extended back to `cutoff` (epoch seconds)"""
+        job = self.jobs.get(channel)
+        if job is None:
+            job = self.jobs[channel] = {'cutoff': cutoff, 'offset_id': 0, 'top_id': None, 'messages': 0, 'done': False}
+        elif cutoff < job['cutoff']:
+            # A longer window continues below the oldest message already written
+            job['cutoff'] = cutoff
+            job['done'] = False
+        return job
+    
+    def advance(self, channel: str, offset_id: int, top_id: int, count: int, done: bool):
+        """Move a channel's cursor once its page is written"""
+        job = self.jobs[channel]
+        job['offset_id'] = offset_id
+        job['top_id'] = job['top_id'] or top_id
+        job['messages'] += count
+        job['done'] = done
+        self.save()
+    
+    def save(self):
+        write_json_atomic(self.path, self.jobs)
+
+class EntityCache:
+    """Persisted username -> input peer cache, so channels are not resolved on every run"""
+    
+    PEER_TYPES = {
+        'channel': (InputPeerChannel, 'channel_id'),
+        'user': (InputPeerUser, 'user_id'),
+        'chat': (InputPeerChat, 'chat_id'),
+    }
+    
+    def __init__(self, path: str = ENTITY_CACHE_FILE, ttl_hours: float = ENTITY_CACHE_TTL_HOURS):
+        self.path = Path(path)
+        self.ttl = ttl_hours * 3600
+        self.entries = {}
+        if self.path.exists():
+            try:
+                self.entries = json.loads(self.path.read_text(encoding='utf-8'))
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable entity cache {self.path}: {e}")
+    
+    def get(self, username: str):
+        """Return the cached input peer for `username`, or None if missing or expired"""
+        entry = self.entries.get(username.lower())
+        if not entry or time.time() - entry['resolved_at'] > self.ttl:
+            return None
+        peer_class = self.PEER_TYPES[entry['type']][0]
+        if entry['type'] == 'chat':
+            return peer_class(entry['id'])
+        return peer_class(entry['id'], entry['access_hash'])
+    
+    def put(self, username: str, entity):
+        try:
+            peer = tg_utils.get_input_peer(entity)
+        except TypeError:
+            # Entities without a usable access_hash can't be cached
+            return
+        for peer_type, (peer_class, id_field) in self.PEER_TYPES.items():
+            if isinstance(peer, peer_class):
+                self.entries[username.lower()] = {
+                    'type': peer_type,
+                    'id': getattr(peer, id_field),
+                    'access_hash': getattr(peer, 'access_hash', None),
+                    'resolved_at': time.time()
+                }
+                return
+    
+    def invalidate(self, username: str):
+        self.entries.pop(username.lower(), None)
+    
+    def missing(self, usernames: list) -> list:
+        return [username for username in usernames if self.get(username) is None]
+    
+    async def warm(self, client, usernames: list, limiter=None):
+        """Fill the cache in bulk from the account's dialogs instead of one lookup per channel"""
+        wanted = {username.lower() for username in self.missing(usernames)}
+        if not wanted:
+            return
+        found = dialogs = 0
+        try:
+            if limiter:
+                await limiter.acquire()
+            async for dialog in client.iter_dialogs():
+                # One token per page of dialogs, taken before the next page is requested
+                dialogs += 1
+                if limiter and dialogs % DIALOGS_PER_REQUEST == 0:
+                    await limiter.acquire()
+                username = getattr(dialog.entity, 'username', None)
+                if username and username.lower() in wanted:
+                    self.put(username, dialog.entity)
+                    found += 1
+        except FloodWaitError as e:
+            # The channels still missing are resolved one by one, once the pause is over
+            logging.warning(f"FloodWait of {e.seconds}s while warming the entity cache from dialogs")
+            if limiter:
+                limiter.pause(e.seconds)
+        logging.info(f"Entity cache warmed with {found} of {len(wanted)} uncached channels from dialogs")
+    
+    def save(self):
+        write_json_atomic(self.path, self.entries)
+
+def write_json_atomic(path: Path, data):
+    """Write-then-rename so a crash never leaves a truncated state file"""
+    tmp_path = path.with_suffix('.tmp')
+    tmp_path.write_text(json.dumps(data, indent=2), encoding='utf-8')
+    os.replace(tmp_path, path)
+
+def to_arrow(rows: list) -> pa.Table:
+    frame = pd.DataFrame(rows, columns=MessageSink.COLUMNS)
+    frame['date'] = pd.to_datetime(frame['date'], utc=True)
+    return pa.Table.from_pandas(frame, schema=PARQUET_SCHEMA, preserve_index=False)
+
+def write_messages(path: str, rows: list):
+    """Write a whole message file, as Parquet or CSV depending on the extension"""
+    if path.endswith('.parquet'):
+        pq.write_table(to_arrow(rows), path, compression=PARQUET_COMPRESSION)
+    else:
+        pd.DataFrame(rows).to_csv(path, index=False)
+
+class MessageSink:
+    """Batched, append-only CSV or Parquet writer so scraped messages never pile up in memory.
+    
+    Each flush appends CSV rows or one Parquet row group; Parquet files are only complete
+    once `close` has written their footer.
+    """
+    
+    COLUMNS = ['channel', 'message_id', 'date', 'text', 'views', 'forwards', 'replies']
+    
+    def __init__(self, route, flush_every: int = 500, on_flush=None, collect: bool = False, store=None,
+                 index=None):
+        self.route = route  # channel -> list of CSV paths its messages belong to
+        self.flush_every = flush_every
+        self.on_flush = on_flush
+        self.store = store
+        self.index = index  # full-text SearchIndex
+        self.batch = []  # records waiting to be upserted into `store` and `index`
+        self.writers = {}  # Parquet path -> open ParquetWriter
+        # Optionally keep every record for an in-process handoff to the analyzer
+        self.records = [] if collect else None
+        self.buffers = {}
+        self.pending = 0
+        self.written = 0
+    
+    def append(self, message: dict):
+        if self.records is not None:
+            self.records.append(message)
+        for path in self.route(message['channel']):
+            self.buffers.setdefault(path, []).append(message)
+        if self.store or self.index:
+            self.batch.append(message)
+        self.pending += 1
+        if self.pending >= self.flush_every:
+            self.flush()
+    
+    def flush(self):
+        with metrics.timer('write_seconds', target='files'):
+            for path, rows in self.buffers.items():
+                if not rows:
+                    continue
+                if path.endswith('.parquet'):
+                    if path not in self.writers:
+                        self.writers[path] = pq.ParquetWriter(path, PARQUET_SCHEMA, compression=PARQUET_COMPRESSION)
+                    self.writers[path].write_table(to_arrow(rows))
+                else:
+                    pd.DataFrame(rows, columns=self.COLUMNS).to_csv(
+                        path, mode='a', header=not os.path.exists(path), index=False
+                    )
+        if self.batch and self.store:
+            with metrics.timer('write_seconds', target='db'):
+                self.store.upsert(self.batch)
+        if self.batch and self.index:
+            with metrics.timer('write_seconds', target='search_index'):
+                self.index.upsert(self.batch)
+        self.batch = []
+        self.written += self.pending
+        self.buffers = {}
+        self.pending = 0
+        if self.on_flush:
+            self.on_flush()
+    
+    def close(self):
+        self.flush()
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+
+def merge_history(hours_back: int, history_file: str = HISTORY_FILE) -> pd.DataFrame:
+    """Compact the append-only history file down to the window, one row per message"""
+    if not os.path.exists(history_file):
+        return pd.DataFrame(columns=MessageSink.COLUMNS)
+    history = pd.read_csv(history_file)
+    
+    history['date'] = pd.to_datetime(history['date'], utc=True)
+    cutoff_time = datetime.now(timezone.utc) - timedelta(hours=hours_back)
+    history = history[history['date'] >= cutoff_time]
+    # Later scrapes carry fresher view/forward counts, so keep the last copy
+    history = history.drop_duplicates(subset=['channel', 'message_id'], keep='last')
+    history = history.sort_values(['channel', 'message_id'])
+    history.to_csv(history_file, index=False)
+    return history
+
+async def scrape_channel(client, channel_username, hours_back, sink, limiter=None, min_id=0, entity_cache=None):
+    """Stream messages from a channel into `sink`, newer than `min_id` when given.
+    
+    Returns the newest message id seen (`min_id` if there was nothing new), or None if the
+    channel could not be read to the end of the window.
+    """
+    newest_id = min_id
+    offset_id = 0  # after a FloodWait, resume below the oldest message already written
+    written = 0
+    for attempt in range(MAX_FLOOD_RETRIES):
+        channel = entity_cache.get(channel_username) if entity_cache else None
+        from_cache = channel is not None
+        try:
+            if limiter:
+                await limiter.acquire()
+            if not from_cache:
+                with metrics.timer('telegram_resolve_seconds'):
+                    channel = await client.get_entity(channel_username)
+                if entity_cache:
+                    entity_cache.put(channel_username, channel)
+                # The token above paid for the lookup; the first history page is another request
+                if limiter:
+                    await limiter.acquire()
+            cutoff_time = datetime.now(timezone.utc) - timedelta(hours=hours_back)
+            
+            # History is returned newest first, so stop at the first message past the window
+            fetch_started = time.perf_counter()
+            async for message in client.iter_messages(channel, min_id=min_id, offset_id=offset_id):
+                if message.date < cutoff_time:
+                    break
+                if limiter and written and written % MESSAGES_PER_REQUEST == 0:
+                    await limiter.acquire()
+                sink.append(message_record(message, channel_username))
+                newest_id = max(newest_id, message.id)
+                offset_id = message.id
+                written += 1
+            
+            metrics.observe('telegram_fetch_seconds', time.perf_counter() - fetch_started, channel=channel_username)
+            metrics.inc('telegram_messages_total', written, channel=channel_username)
+            return newest_id
+        except FloodWaitError as e:
+            metrics.inc('telegram_flood_waits_total')
+            metrics.inc('telegram_flood_wait_seconds_total', e.seconds)
+            logging.warning(f"FloodWait of {e.seconds}s on {channel_username} "
+                            f"(attempt {attempt + 1}/{MAX_FLOOD_RETRIES})")
+            if limiter:
+                limiter.pause(e.seconds)
+            else:
+                await asyncio.sleep(e.seconds)
+        except Exception as e:
+            if entity_cache:
+                entity_cache.invalidate(channel_username)
+            if from_cache:
+                logging.warning(f"Cached peer for {channel_username} failed ({e}), resolving again")
+                continue
+            logging.error(f"Error scraping channel {channel_username}: {e}")
+            metrics.inc('telegram_channel_errors_total')
+            return None
+    
+    logging.error(f"Giving up on channel {channel_username} after repeated FloodWaits")
+    return None
+
+async def scrape_channels(client, channels, hours_back, sink, limiter, workers, checkpoints=None, entity_cache=None):
+    """Scrape channels into `sink` with a bounded pool of workers sharing one rate limiter"""
+    queue = asyncio.Queue()
+    for channel in channels:
+        queue.put_nowait(channel)
+    
+    async def worker():
+        while True:
+            try:
+                channel = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            min_id = checkpoints.get(channel) if checkpoints else 0
+            newest_id = await scrape_channel(client, channel, hours_back, sink, limiter, min_id, entity_cache)
+            # A checkpoint only moves once the whole channel is in the sink, so a crash
+            # can never leave a gap between the stored history and the new high-water mark
+            if checkpoints and newest_id is not None:
+                checkpoints.stage(channel, newest_id)
+    
+    await asyncio.gather(*(worker() for _ in range(max(1, min(workers, len(channels))))))
+
+async def backfill_channel(client, channel_username, state, sink, limiter=None, entity_cache=None,
+                           page_size: int = BACKFILL_PAGE_SIZE) -> bool:
+    """Walk a channel's history back to its job's cutoff one page at a time.
+    
+    Each page is flushed from `sink` before the cursor is saved, so a crash or FloodWait
+    repeats at most the page in flight. Returns False if the channel has to be retried.
+    """
+    job = state.jobs[channel_username]
+    channel = None
+    flood_waits = 0
+    while not job['done']:
+        from_cache = False
+        try:
+            if channel is None:
+                channel = entity_cache.get(channel_username) if entity_cache else None
+                from_cache = channel is not None
+                if not from_cache:
+                    if limiter:
+                        await limiter.acquire()
+                    with metrics.timer('telegram_resolve_seconds'):
+                        channel = await client.get_entity(channel_username)
+                    if entity_cache:
+                        entity_cache.put(channel_username, channel)
+            if limiter:
+                # One token per request of MESSAGES_PER_REQUEST messages in the page
+                for _ in range(-(-page_size // MESSAGES_PER_REQUEST)):
+                    await limiter.acquire()
+            with metrics.timer('telegram_fetch_seconds', channel=channel_username):
+                page = await client.get_messages(channel, limit=page_size, offset_id=job['offset_id'])
+        except FloodWaitError as e:
+            metrics.inc('telegram_flood_waits_total')
+            metrics.inc('telegram_flood_wait_seconds_total', e.seconds)
+            flood_waits += 1
+            logging.warning(f"FloodWait of {e.seconds}s on {channel_username} "
+                            f"(attempt {flood_waits}/{MAX_FLOOD_RETRIES}), page resumes at {job['offset_id']}")
+            if flood_waits >= MAX_FLOOD_RETRIES:
+                logging.error(f"Giving up on channel {channel_username} for now after repeated FloodWaits")
+                return False
+            if limiter:
+                limiter.pause(e.seconds)
+            else:
+                await asyncio.sleep(e.seconds)
+            continue
+        except Exception as e:
+            if entity_cache:
+                entity_cache.invalidate(channel_username)
+            channel = None
+            if from_cache:
+                logging.warning(f"Cached peer for {channel_username} failed ({e}), resolving again")
+                continue
+            logging.error(f"Error backfilling channel {channel_username}: {e}")
+            metrics.inc('telegram_channel_errors_total')
+            return False
         
-        return messages
-    except Exception as e:
-        logging.error(f"Error scraping channel {channel_username}: {e}")
-        return []
+        flood_waits = 0
+        in_window = [message for message in page if message.date.timestamp() >= job['cutoff']]
+        for message in in_window:
+            sink.append(message_record(message, channel_username))
+        sink.flush()
+        metrics.inc('telegram_messages_total', len(in_window), channel=channel_username)
+        metrics.inc('backfill_pages_total')
+        # A short page is the start of the channel; an out-of-window message is the cutoff.
+        # The cursor stops at the oldest message written, so a longer window resumes right below it.
+        done = len(page) < page_size or len(in_window) < len(page)
+        state.advance(channel_username, in_window[-1].id if in_window else job['offset_id'],
+                      in_window[0].id if in_window else None, len(in_window), done)
+    return True
+
+async def backfill_channels(client, channels, state, sink, limiter, workers, entity_cache=None,
+                            page_size: int = BACKFILL_PAGE_SIZE) -> list:
+    """Backfill channels with a bounded pool of workers; returns the channels left unfinished"""
+    queue = asyncio.Queue()
+    for channel in channels:
+        queue.put_nowait(channel)
+    unfinished = []
+    
+    async def worker():
+        while True:
+            try:
+                channel = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            if await backfill_channel(client, channel, state, sink, limiter, entity_cache, page_size):
+                logging.info(f"Backfilled {channel}: {state.jobs[channel]['messages']} messages")
+            else:
+                unfinished.append(channel)
+    
+    await asyncio.gather(*(worker() for _ in range(max(1, min(workers, len(channels))))))
+    return unfinished
 
-async def async_main(hours: int):
+class Shard:
+    """One Telegram account's connected client, rate limiter and entity cache"""
+    
+    def __init__(self, name: str, client, limiter, entity_cache):
+        self.name = name
+        self.client = client
+        self.limiter = limiter
+        self.entity_cache = entity_cache
+
+def load_sessions() -> list:
+    """Telegram accounts from .env: API_ID/API_HASH/PHONE, then API_ID_2/API_HASH_2/PHONE_2, ..."""
     load_dotenv()
+    sessions = [{'name': session_path.stem, 'api_id': os.getenv('API_ID'),
+                 'api_hash': os.getenv('API_HASH'), 'phone': os.getenv('PHONE')}]
+    index = 2
+    while os.getenv(f'API_ID_{index}'):
+        sessions.append({'name': f"{session_path.stem}_{index}", 'api_id': os.getenv(f'API_ID_{index}'),
+                         'api_hash': os.getenv(f'API_HASH_{index}'), 'phone': os.getenv(f'PHONE_{index}')})
+        index += 1
+    return sessions
+
+def assign_shards(channels: list, shard_names: list) -> dict:
+    """Partition channels across shards by rendezvous hashing.
     
-    # Telegram credentials
-    client = await get_client(
+    A channel keeps its shard across runs, and adding or removing an account only moves
+    the channels that belong to it, so each account's entity cache stays warm.
+    """
+    assignment = {name: [] for name in shard_names}
+    for channel in channels:
+        owner = max(shard_names, key=lambda name: hashlib.md5(f"{name}/{channel.lower()}".encode('utf-8')).digest())
+        assignment[owner].append(channel)
+    return assignment
+
+def shard_entity_cache_file(name: str) -> str:
+    # The first account keeps the original cache file; access hashes are only valid per account
+    return ENTITY_CACHE_FILE if name == session_path.stem else f"entity_cache_{name}.json"
+
+async def scrape_once(client, registry: dict, hours: int, limiter, workers: int, entity_cache,
+                      checkpoints=None, flush_every: int = 500, write_csv: bool = True, collect: bool = False,
+                      store: MessageStore = None, file_format: str = 'csv', index=None):
+    """Scrape all registered channels with an already connected client.
+    
+    Returns the run timestamp and, with `collect`, the scraped records. With a `store`
+    and/or a search `index`, every message is also upserted there. Message files are
+    written as `file_format` (csv or parquet).
+    """
+    return await scrape_shards([Shard(session_path.stem, client, limiter, entity_cache)], registry, hours, workers,
+                               checkpoints, flush_every, write_csv, collect, store, file_format, index)
+
+async def scrape_shards(shards: list, registry: dict, hours: int, workers: int, checkpoints=None,
+                        flush_every: int = 500, write_csv: bool = True, collect: bool = False,
+                        store: MessageStore = None, file_format: str = 'csv', index=None):
+    """Scrape all registered channels, split across shards that each run `workers` workers.
+    
+    All shards write into one sink, so the output is the same as from a single account.
+    """
+    channels = list(registry)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    
+    # Stream every channel once, whatever categories it belongs to. Incremental runs append
+    # to the history file (unless the store keeps the history); otherwise rows go straight
+    # into one CSV per category.
+    if checkpoints:
+        history = [] if store else [HISTORY_FILE]
+        sink = MessageSink(lambda channel: history, flush_every, on_flush=checkpoints.commit, store=store, index=index)
+    elif write_csv:
+        sink = MessageSink(
+            lambda channel: [f'crypto_{category}_messages_{timestamp}.{file_format}' for category in registry[channel]],
+            flush_every, collect=collect, store=store, index=index
+        )
+    else:
+        sink = MessageSink(lambda channel: [], flush_every, collect=collect, store=store, index=index)
+    assignment = assign_shards(channels, [shard.name for shard in shards])
+    
+    async def scrape_shard(shard):
+        with metrics.timer('shard_scrape_seconds', shard=shard.name):
+            await scrape_channels(shard.client, assignment[shard.name], hours, sink, shard.limiter, workers,
+                                  checkpoints, shard.entity_cache)
+    
+    try:
+        with metrics.timer('stage_seconds', stage='scrape'):
+            await asyncio.gather(*(scrape_shard(shard) for shard in shards))
+    finally:
+        # Keep whatever was scraped, even if the run is interrupted
+        sink.close()
+        for shard in shards:
+            shard.entity_cache.save()
+    logging.info(f"Scraped {sink.written} messages")
+    
+    records = sink.records
+    if checkpoints:
+        with metrics.timer('stage_seconds', stage='merge_history'):
+            records = store.window(hours, channels) if store else merge_history(hours).to_dict('records')
+        if write_csv:
+            # Save one CSV per category, built from the single fetch
+            for category, category_messages in split_by_category(records, registry).items():
+                write_messages(f'crypto_{category}_messages_{timestamp}.{file_format}', category_messages)
+    
+    return timestamp, records if collect else None
+
+async def connect(sequential_updates: bool = False):
+    """Connect with the credentials from .env"""
+    load_dotenv()
+    return await get_client(
         os.getenv('API_ID'),
         os.getenv('API_HASH'),
-        os.getenv('PHONE')
+        os.getenv('PHONE'),
+        sequential_updates
     )
+
+class MentionAlerts:
+    """Logs an alert when a coin is mentioned `threshold` times within a rolling window"""
     
-    crypto_telegram_channels = [
-        'PUMPNOW800',
-        'JimmyLeshTrader',
-        'Robertt_admin',
-        'Cryptoprofitcoachadmin',
-        'cryptohoyden',
-        'attackerme',
-        'Arpiner7',
-        'Erick',
-        'DmitriFRI',
-        'philipv7',
-        'wallstreetqueenadmin',
-        'cicalex',
-        'alexad07',
-        'Olivia_Soul',
-        'gqsoul',
-        'arbitragetesting',
-        'Lucky_Adams',
-        'TheJenus',
-        'Bianket_Men',
-        'KerolosAdel',
-        'TopGbrg',
-        'ProCrypto_NY2',
-        'MichelleGreen1',
-        '4evercrypto',
-        'JedasnK',
-        'ElizG',
-        'DimaF',
-        'ivanpetrov',
-        'CryptoKing',
-        'alexcastro5',
-        'steveadm',
-        'justincrypto',
-        'Marcsxb',
-        'top9_rian',
-        'forthelulz',
-        'samirpower',
-        'Pac43',
-        'naatween',
-        'smebm',
-        'CryptoGirl_Mar',
-        'RobertoK',
-        'algaeblitz2',
-        'rob_whale',
-        'CryptoGrows',
-        'mikevazovskyi',
-        'miaMybtc',
-        'elibraX',
-        'jonnesnow',
-        'Rocket_Pump_Channel',
-        'iqcash_admin',
-        'tomexpert',
-        'davecf',
-        'Rose_Javelin',
-        'Cryptonews',
-        'frankdefi',
-        'monetizesupport',
-        'Pentoska',
-        'Cryptoadmin',
-        'leoversa',
-        'ralfvm',
-        'PAULHEX',
-        'MEGA_SHARK',
-        'cryptosamurai_owner',
-        'jamescpt',
-        'ryder_reilly',
-        'CryptoJohn',
-        'Oliverbf',
-        'vip_crypto_signals_company',
-        'astroboiz',
-        'robertus78',
-        'GodBarni',
-        'antoncrypt',
-        'BCPCadmin',
-        'Rachel_Ree',
-        'Merc_hawk',
-        'AaronWithCrypto',
-        'CryptoNewsAdmin',
-        'saloni_jn',
-        'ProjectPromoters',
-        'brianbollinger',
-        'Altcoin_Admin',
-        'TraderLucYY',
-        'Bulls_Admintrader',
-        'nakamotocat',
-        'ELizabeth_WST',
-        'jasonbuzz',
-        'Cryptosupport',
-        'Steve_Admin',
-        'AllenWestern',
-        'SwedenTrader',
-        'raitlukass',
-        'CryptoTrader2014',
-        'infostoreeu',
-        'Margin_Trader',
-        'cryptorank',
-        'Fesions',
-        'BitcoinSmarts',
-        'Lishats',
-        'crypto_faux'
-    ]
+    def __init__(self, matcher, threshold: int = 20, window_minutes: float = 10):
+        self.matcher = matcher
+        self.threshold = threshold
+        self.window = window_minutes * 60
+        self.mentions = {}  # name -> deque of mention times
+        self.last_alert = {}
     
-    crypto_news_channels = [
-        'miaMybtc',
-        'attackerme',
-        'Arpiner7',
-        'jonnesnow',
-        'tomexpert',
-        'Cryptonews',
-        'frankdefi',
-        'monetizesupport',
-        'Pentoska',
-        'leoversa',
-        'ralfvm',
-        'jamescpt',
-        'ryder_reilly',
-        'CryptoJohn',
-        'philipv7',
-        'alexad07',
-        'Oliverbf',
-        'iqcash_admin',
-        'gqsoul',
-        'astroboiz',
-        'robertus78',
-        'GodBarni',
-        'Rachel_Ree',
-        'Merc_hawk',
-        'AaronWithCrypto',
-        'CryptoNewsAdmin',
-        'saloni_jn',
-        'Olivia_Soul',
-        'brianbollinger',
-        'nakamotocat',
-        'cryptorank',
-        'BitcoinSmarts',
-        'crypto_faux',
-        'CryptoRetro',
-        'CryptoFight',
-        'CryptoGem',
-        'CryptoIndustry',
-        'CryptoHunter',
-        'CryptoCall',
-        'CryptoExpert',
-        'TONCryptoNews',
-        'CryptoShilling',
-        'DeFiNews',
-        'CryptoNewspaper',
-        'CryptoMax',
-        'CryptoBox',
-        'CryptoLake',
-        'CryptoPower',
-        'CryptoUnited',
-        'Crypto4News',
-        'CryptoMagazine',
-        'CryptoHub',
-        'CryptoArena',
-        'TokensStream',
-        'CryptoLand',
-        'CryptoLVL',
-        'TokenMap',
-        'CryptoPortal',
-        'GimmeCoin',
-        'GildCoin',
-        'DroppersOfBTC',
-        'BlockchainProgress',
-        'CryptoPush',
-        'CryptoBitca',
-        'CryptoClubUSA',
-        'CryptoCaliforniaClub',
-        'CoinQuest',
-        'NFTERA',
-        'AltcoinHolder',
-        'CryptoFlake',
-        'CoinGapeNews',
-        'CryptoUnfolded',
-        'ProCryptoNews',
-        'FirstCryptoNews',
-        'CryptoRankNews',
-        'Cointelegraph',
-        'BitcoinNews',
-        'CryptoDaily',
-        'CoinDesk',
-        'CryptoSlate',
-        'TheBlock',
-        'DecryptMedia',
-        'CoinTelegraph',
-        'BitcoinMagazine',
-        'CryptoGlobe',
-        'NewsBTC',
-        'CryptoBriefing',
-        'CryptoNinjas',
-        'BitcoinExchangeGuide',
-        'CryptoNewsZ',
-        'BlockchainNews',
-        'CryptoNewsPoint',
-        'CoinSpeaker',
-        'BitcoinWarrior',
-        'CryptoNewsWorld',
-        'CryptoReporter',
-        'BlockchainReporter',
-        'CryptoTicker',
-        'CoinJournal',
-        'CryptoVest',
-        'CryptoNewsLine',
-        'CoinPedia',
-        'BitcoinistNews',
-        'CryptoNewsNow',
-        'BlockTribune',
-        'CryptoGazette',
-        'BitcoinNewsToday',
-        'CryptoNewsWire',
-        'BlockchainTimes',
-        'CryptoNewsDaily',
-        'BitcoinCentral',
-        'CryptoNewsUpdate',
-        'BlockchainReport',
-        'CryptoNewsFlash',
-        'BitcoinPulse',
-        'CryptoNewsWatch',
-        'BlockchainPress',
-        'CryptoNewsNetwork',
-        'BitcoinTrend',
-        'CryptoNewsBeat',
-        'BlockchainBuzz',
-        'CryptoNewsToday',
-        'BitcoinInsider',
-        'CryptoNewsFeed',
-        'BlockchainFocus',
-        'CryptoNewsLive',
-        'BitcoinReport',
-        'CryptoNewsAlert',
-        'BlockchainDaily',
-        'CryptoNewsDigest',
-        'BitcoinBulletin',
-        'CryptoNewsCentral',
-        'BlockchainWeekly',
-        'CryptoNewsJournal',
-        'BitcoinChronicle',
-        'CryptoNewsMonitor',
-        'BlockchainInsight',
-        'CryptoNewsRadar',
-        'BitcoinObserver',
-        'CryptoNewsSource',
-        'BlockchainUpdate',
-        'CryptoNewsSummary',
-        'BitcoinAnalyst',
-        'CryptoNewsTracker',
-        'BlockchainWatch',
-        'CryptoNewsVision',
-        'BitcoinMonitor',
-        'BlockchainXpress',
-        'CryptoNewsZone',
-        'BitcoinDigest',
-        'CryptoNewsBase',
-        'BlockchainCentral',
-        'CryptoNewsChannel',
-        'BitcoinDispatch',
-        'CryptoNewsDesk',
-        'BlockchainEra',
-        'CryptoNewsFocus',
-        'BitcoinGlobal',
-        'CryptoNewsHub',
-        'BlockchainIntel',
-        'CryptoNewsIndex',
-        'BitcoinJournal',
-        'CryptoNewsKing',
-        'BlockchainLine',
-        'CryptoNewsMaker',
-        'BitcoinNetwork'
-    ]
+    def observe(self, record: dict):
+        now = time.monotonic()
+        for name, count in self.matcher.count([record['text']]).items():
+            if not count:
+                continue
+            times = self.mentions.setdefault(name, deque())
+            times.extend([now] * count)
+            while times and now - times[0] > self.window:
+                times.popleft()
+            # At most one alert per coin per window
+            if len(times) >= self.threshold and now - self.last_alert.get(name, -self.window) > self.window:
+                self.last_alert[name] = now
+                logging.warning(f"ALERT: {name} mentioned {len(times)} times "
+                                f"in the last {self.window / 60:g} minutes, latest in {record['channel']}")
+
+async def resolve_peer(client, username: str, limiter, entity_cache):
+    """Look up one channel and cache it, retrying after FloodWaits; None if it can't be resolved"""
+    for attempt in range(MAX_FLOOD_RETRIES):
+        try:
+            await limiter.acquire()
+            entity = await client.get_entity(username)
+        except FloodWaitError as e:
+            logging.warning(f"FloodWait of {e.seconds}s while resolving {username} "
+                            f"(attempt {attempt + 1}/{MAX_FLOOD_RETRIES})")
+            # The retry waits in acquire() until the pause is over
+            limiter.pause(e.seconds)
+            continue
+        except Exception as e:
+            logging.error(f"Could not resolve {username}: {e}")
+            return None
+        entity_cache.put(username, entity)
+        return entity_cache.get(username) or entity
+    logging.error(f"Giving up on resolving {username} after repeated FloodWaits, it will not be ingested live")
+    return None
+
+async def resolve_peers(client, usernames: list, limiter, entity_cache) -> dict:
+    """Input peers for `usernames`, from the entity cache where possible"""
+    peers = {}
+    for username in usernames:
+        peer = entity_cache.get(username)
+        if peer is None:
+            peer = await resolve_peer(client, username, limiter, entity_cache)
+        if peer is not None:
+            peers[username] = peer
+    entity_cache.save()
+    return peers
+
+async def start_live_ingestion(client, registry: dict, limiter, entity_cache, sink, queue_size: int = 1000,
+                               flush_seconds: float = 5, alerts: MentionAlerts = None):
+    """Subscribe to new and edited messages in the registered channels.
     
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    Event handlers put records on a bounded queue; with a sequential-updates client a full
+    queue holds back the update stream instead of buffering without limit. A consumer task
+    writes records to `sink` (flushing at least every `flush_seconds`) and feeds `alerts`.
+    Returns the consumer task; stop it with stop_live_ingestion so queued records are kept.
+    """
+    peers = await resolve_peers(client, list(registry), limiter, entity_cache)
+    usernames = {tg_utils.get_peer_id(peer): username for username, peer in peers.items()}
+    queue = asyncio.Queue(maxsize=queue_size)
+    
+    async def on_message(event):
+        username = usernames.get(event.chat_id)
+        if username:
+            metrics.inc('live_messages_total', edited=isinstance(event, events.MessageEdited.Event))
+            await queue.put(message_record(event.message, username))
+    
+    chats = list(peers.values())
+    client.add_event_handler(on_message, events.NewMessage(chats=chats))
+    # An edit arrives as the same (channel, message_id); the history merge keeps the latest text
+    client.add_event_handler(on_message, events.MessageEdited(chats=chats))
+    logging.info(f"Listening for new messages in {len(chats)} channels")
+    
+    async def consume():
+        flush_deadline = time.monotonic() + flush_seconds
+        # asyncio.wait, unlike wait_for, never swallows a cancel that races with a finished get
+        getter = None
+        try:
+            while True:
+                getter = getter or asyncio.ensure_future(queue.get())
+                done, _ = await asyncio.wait({getter}, timeout=max(0, flush_deadline - time.monotonic()))
+                record = getter.result() if done else None
+                if done:
+                    getter = None
+                if record is not None:
+                    sink.append(record)
+                    if alerts and isinstance(record['text'], str):
+                        alerts.observe(record)
+                # Flush on a deadline, so steady traffic below flush_every still reaches disk
+                if not sink.pending or time.monotonic() >= flush_deadline:
+                    if sink.pending:
+                        sink.flush()
+                    flush_deadline = time.monotonic() + flush_seconds
+        except asyncio.CancelledError:
+            # Shutting down: keep what the handlers already queued
+            if getter and getter.done():
+                sink.append(getter.result())
+            elif getter:
+                getter.cancel()
+            while not queue.empty():
+                sink.append(queue.get_nowait())
+            raise
+    
+    def on_done(task):
+        if not task.cancelled() and task.exception():
+            # Nothing drains the queue any more, so a sequential-updates client would stall on it
+            logging.error(f"Live ingestion failed, disconnecting: {task.exception()!r}")
+            metrics.inc('live_ingestion_errors_total')
+            asyncio.ensure_future(client.disconnect())
+    
+    consumer = asyncio.create_task(consume())
+    consumer.add_done_callback(on_done)
+    return consumer
+
+async def stop_live_ingestion(consumer):
+    """Cancel the consumer task once it has moved the queued records into its sink"""
+    consumer.cancel()
+    await asyncio.gather(consumer, return_exceptions=True)
+
+def open_search_index(path: str):
+    # Imported here because the index tags messages with the reporter's coin matcher
+    from crypto_cynic_search import SearchIndex
+    return SearchIndex(path) if path else None
+
+async def run_live(workers: int = 8, rate: float = 2.0, entity_ttl: float = ENTITY_CACHE_TTL_HOURS,
+                   channels_file: str = CHANNELS_FILE, flush_every: int = 500, queue_size: int = 1000,
+                   alert_threshold: int = 20, alert_window: float = 10, db_url: str = None,
+                   metrics_port: int = None, index_path: str = None):
+    """Push ingestion: append messages to the history file (or the store) as they are posted"""
+    from crypto_cynic_tg_reporter import CRYPTO_DICT, MentionMatcher
+    
+    registry = load_channel_registry(channels_file)
+    client = await connect(sequential_updates=True)
+    limiter = TokenBucket(rate, capacity=max(rate, workers))
+    entity_cache = EntityCache(ttl_hours=entity_ttl)
+    store = MessageStore(db_url) if db_url else None
+    history = [] if store else [HISTORY_FILE]
+    sink = MessageSink(lambda channel: history, flush_every, store=store, index=open_search_index(index_path))
+    alerts = MentionAlerts(MentionMatcher(CRYPTO_DICT), alert_threshold, alert_window)
+    consumer = None
+    try:
+        if metrics_port:
+            await metrics.serve(metrics_port)
+        await entity_cache.warm(client, list(registry), limiter)
+        consumer = await start_live_ingestion(client, registry, limiter, entity_cache, sink, queue_size, alerts=alerts)
+        # The consumer disconnects the client if it fails, which ends this wait too
+        await client.run_until_disconnected()
+        if consumer.done() and not consumer.cancelled() and consumer.exception():
+            raise consumer.exception()
+    finally:
+        if consumer:
+            await stop_live_ingestion(consumer)
+        sink.flush()
+        await client.disconnect()
+
+async def connect_shards(shards: list, registry: dict, sessions: list, rate: float, workers: int,
+                         entity_ttl: float, client_factory=None):
+    """Connect every session and warm its entity cache, appending to `shards` as they connect.
     
-    # Scrape trading channels
-    trading_messages = []
-    for channel in crypto_telegram_channels:
-        messages = await scrape_channel(client, channel, hours)
-        trading_messages.extend(messages)
-        await asyncio.sleep(2)  # Rate limiting
-    
-    # Scrape news channels
-    news_messages = []
-    for channel in crypto_news_channels:
-        messages = await scrape_channel(client, channel, hours)
-        news_messages.extend(messages)
-        await asyncio.sleep(2)  # Rate limiting
-    
-    # Save to CSV files
-    if trading_messages:
-        pd.DataFrame(trading_messages).to_csv(f'crypto_trading_messages_{timestamp}.csv', index=False)
-    if news_messages:
-        pd.DataFrame(news_messages).to_csv(f'crypto_news_messages_{timestamp}.csv', index=False)
-    
-    await client.disconnect()
-    return timestamp
+    `shards` is filled in place so the caller can disconnect the ones already connected
+    if a later login fails.
+    """
+    if client_factory is None:
+        async def client_factory(session):
+            return await get_client(session['api_id'], session['api_hash'], session['phone'],
+                                    session=f"{session['name']}.session")
+    assignment = assign_shards(list(registry), [session['name'] for session in sessions])
+    for session in sessions:
+        client = await client_factory(session)
+        # Rate limits are per account, so every shard gets the full rate
+        shard = Shard(session['name'], client, TokenBucket(rate, capacity=max(rate, workers)),
+                      EntityCache(shard_entity_cache_file(session['name']), entity_ttl))
+        shards.append(shard)
+        await shard.entity_cache.warm(client, assignment[shard.name], shard.limiter)
+    if len(shards) > 1:
+        logging.info(f"Scraping with {len(shards)} accounts: " +
+                     ', '.join(f"{name} ({len(assigned)} channels)" for name, assigned in assignment.items()))
+
+async def async_main(hours: int, workers: int = 8, rate: float = 2.0, incremental: bool = False,
+                     entity_ttl: float = ENTITY_CACHE_TTL_HOURS, channels_file: str = CHANNELS_FILE,
+                     flush_every: int = 500, write_csv: bool = True, collect: bool = False, db_url: str = None,
+                     sharded: bool = False, client_factory=None, file_format: str = 'csv', index_path: str = None):
+    """Scrape all registered channels; returns the run timestamp and, with `collect`, the records.
+    
+    With `sharded`, channels are split across every account in .env, each with its own
+    session, rate limit and entity cache. `client_factory(session)` returns a connected
+    client for a load_sessions() entry (default: log in with get_client).
+    """
+    registry = load_channel_registry(channels_file)
+    store = MessageStore(db_url) if db_url else None
+    logging.info(f"Loaded {len(registry)} unique channels from {channels_file}")
+    
+    # Telegram credentials
+    sessions = load_sessions() if sharded else load_sessions()[:1]
+    shards = []
+    try:
+        await connect_shards(shards, registry, sessions, rate, workers, entity_ttl, client_factory)
+        return await scrape_shards(
+            shards, registry, hours, workers,
+            CheckpointStore() if incremental else None, flush_every, write_csv, collect, store, file_format,
+            open_search_index(index_path)
+        )
+    finally:
+        for shard in shards:
+            await shard.client.disconnect()
+
+async def run_backfill(hours: int, workers: int = 8, rate: float = 2.0, entity_ttl: float = ENTITY_CACHE_TTL_HOURS,
+                       channels_file: str = CHANNELS_FILE, page_size: int = BACKFILL_PAGE_SIZE,
+                       takeout: bool = False, db_url: str = None, sharded: bool = False,
+                       index_path: str = None, client_factory=None, state_file: str = BACKFILL_STATE_FILE) -> list:
+    """Build `hours` of history page by page, resuming from the cursors in `state_file`.
+    
+    Messages go to the store (with `db_url`) or are appended to BACKFILL_FILE, and to the
+    search index. With `takeout`, each account reads through a takeout session, which
+    Telegram rate-limits less strictly for bulk exports. Once a channel is complete and a
+    store is used, the incremental checkpoint moves to the newest backfilled message so
+    `--incremental` runs carry on from there. Returns the unfinished channels.
+    """
+    registry = load_channel_registry(channels_file)
+    store = MessageStore(db_url) if db_url else None
+    state = BackfillState(state_file)
+    cutoff = (datetime.now(timezone.utc) - timedelta(hours=hours)).timestamp()
+    for channel in registry:
+        state.start(channel, cutoff)
+    pending = [channel for channel in registry if not state.jobs[channel]['done']]
+    logging.info(f"Backfilling {len(pending)} of {len(registry)} channels "
+                 f"({len(registry) - len(pending)} already complete)")
+    
+    history = [] if store else [BACKFILL_FILE]
+    sink = MessageSink(lambda channel: history, page_size, store=store, index=open_search_index(index_path))
+    sessions = load_sessions() if sharded else load_sessions()[:1]
+    shards = []
+    unfinished = []
+    try:
+        await connect_shards(shards, registry, sessions, rate, workers, entity_ttl, client_factory)
+        assignment = assign_shards(pending, [shard.name for shard in shards])
+        readers = {shard.name: shard.client for shard in shards}
+        # Takeout sessions are finished on the way out, before the clients disconnect
+        async with AsyncExitStack() as stack:
+            if takeout:
+                for shard in shards:
+                    try:
+                        readers[shard.name] = await stack.enter_async_context(
+                            shard.client.takeout(finalize=True, channels=True, megagroups=True)
+                        )
+                    except TakeoutInitDelayError as e:
+                        logging.warning(f"Takeout for {shard.name} is available in {e.seconds}s (confirm the "
+                                        f"request in Telegram first), continuing with a regular session")
+            
+            async def backfill_shard(shard):
+                with metrics.timer('shard_scrape_seconds', shard=shard.name):
+                    unfinished.extend(await backfill_channels(
+                        readers[shard.name], assignment[shard.name], state, sink, shard.limiter, workers,
+                        shard.entity_cache, page_size
+                    ))
+            
+            with metrics.timer('stage_seconds', stage='backfill'):
+                await asyncio.gather(*(backfill_shard(shard) for shard in shards))
+    finally:
+        sink.close()
+        for shard in shards:
+            shard.entity_cache.save()
+            await shard.client.disconnect()
+    
+    if not store and not unfinished:
+        # Drop the copies of pages that were repeated after an interruption, keeping the
+        # whole window even when an earlier, longer backfill set it
+        oldest = min(state.jobs[channel]['cutoff'] for channel in registry)
+        merge_history(max(hours, (time.time() - oldest) / 3600), BACKFILL_FILE)
+    if store:
+        checkpoints = CheckpointStore()
+        for channel in registry:
+            job = state.jobs[channel]
+            if job['done'] and job['top_id']:
+                checkpoints.stage(channel, job['top_id'])
+        checkpoints.commit()
+    total = sum(job['messages'] for job in state.jobs.values())
+    if unfinished:
+        logging.warning(f"Backfill incomplete for {len(unfinished)} channels, run again to resume: "
+                        f"{', '.join(unfinished)}")
+    else:
+        logging.info(f"Backfill complete: {total} messages from {len(registry)} channels")
+    return unfinished
+
+def run_pipeline(hours: int = 1, ai_service: str = 'openai', keep_files: bool = False,
+                 analyzer_options: dict = None, **scrape_options) -> str:
+    """Scrape and analyze in one process, handing records to the analyzer in memory.
+    
+    CSV files are only written when `keep_files` is set. `analyzer_options` are passed to
+    CryptoAnalyzer (token_budget, concurrency, rpm, tpm). Returns the report file path.
+    """
+    # Imported here so scrape-only callers don't load the AI SDKs
+    from crypto_cynic_tg_reporter import CryptoAnalyzer
+    
+    timestamp, records = asyncio.run(
+        async_main(hours, write_csv=keep_files, collect=True, **scrape_options)
+    )
+    analyzer = CryptoAnalyzer(ai_service, keep_files, timestamp, **(analyzer_options or {}))
+    try:
+        return analyzer.analyze_records(records)
+    finally:
+        analyzer.close()
+
+async def run_daemon(hours: int, ai_service: str, keep_files: bool, interval_minutes: float,
+                     workers: int = 8, rate: float = 2.0, entity_ttl: float = ENTITY_CACHE_TTL_HOURS,
+                     channels_file: str = CHANNELS_FILE, flush_every: int = 500, analyzer_options: dict = None,
+                     live: bool = False, queue_size: int = 1000, db_url: str = None,
+                     metrics_file: str = None, metrics_port: int = None, file_format: str = 'csv',
+                     index_path: str = None, alert_threshold: int = 20, alert_window: float = 10):
+    """Stay connected and run an incremental scrape plus report every `interval_minutes`.
+    
+    The Telegram connection, rate limiter, entity cache, checkpoints and analyzer (with its
+    AI quotas and response cache) live for the whole process instead of being rebuilt per run.
+    With `live`, new messages are also pushed into the history between runs, alerting on
+    mention spikes as in run_live. Metrics
+    accumulate over the process and are written to `metrics_file` after every run and/or
+    served on `metrics_port`.
+    """
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler
+    from crypto_cynic_tg_reporter import CRYPTO_DICT, CryptoAnalyzer, MentionMatcher
+    
+    registry = load_channel_registry(channels_file)
+    logging.info(f"Loaded {len(registry)} unique channels from {channels_file}")
+    client = await connect(sequential_updates=live)
+    limiter = TokenBucket(rate, capacity=max(rate, workers))
+    entity_cache = EntityCache(ttl_hours=entity_ttl)
+    checkpoints = CheckpointStore()
+    store = MessageStore(db_url) if db_url else None
+    analyzer = CryptoAnalyzer(ai_service, keep_files, None, **(analyzer_options or {}))
+    await entity_cache.warm(client, list(registry), limiter)
+    history = [] if store else [HISTORY_FILE]
+    index = open_search_index(index_path)
+    live_sink = MessageSink(lambda channel: history, flush_every, store=store, index=index)
+    consumer = None
+    server = await metrics.serve(metrics_port) if metrics_port else None
+    if live:
+        alerts = MentionAlerts(MentionMatcher(CRYPTO_DICT), alert_threshold, alert_window)
+        consumer = await start_live_ingestion(client, registry, limiter, entity_cache, live_sink, queue_size,
+                                              alerts=alerts)
+    
+    async def scheduled_run():
+        try:
+            live_sink.flush()
+            timestamp, records = await scrape_once(
+                client, registry, hours, limiter, workers, entity_cache,
+                checkpoints, flush_every, keep_files, collect=True, store=store, file_format=file_format,
+                index=index
+            )
+            analyzer.timestamp = timestamp
+            await analyzer.analyze_records_async(records)
+        except Exception as e:
+            metrics.inc('run_errors_total')
+            logging.error(f"Scheduled run failed: {e}")
+        metrics.inc('runs_total')
+        if metrics_file:
+            metrics.export(metrics_file)
+    
+    scheduler = AsyncIOScheduler()
+    # Runs never overlap; a run that falls behind is coalesced instead of queued up
+    scheduler.add_job(scheduled_run, 'interval', minutes=interval_minutes, next_run_time=datetime.now(),
+                      max_instances=1, coalesce=True)
+    scheduler.start()
+    logging.info(f"Daemon started, reporting every {interval_minutes} minutes")
+    try:
+        # Runs until interrupted; a failed live consumer raises here and stops the daemon
+        await (consumer if consumer else asyncio.Event().wait())
+    finally:
+        scheduler.shutdown(wait=False)
+        if consumer:
+            await stop_live_ingestion(consumer)
+        if server:
+            server.close()
+        analyzer.close()
+        live_sink.flush()
+        await client.disconnect()
 
 def main():
     parser = argparse.ArgumentParser(description='Telegram Channel Scraper')
     parser.add_argument('--hours', type=int, default=1,
                        help='Number of hours of history to scrape (default: 1)')
-    parser.add_argument('--ai', choices=['openai', 'gemini'], default='openai',
-                       help='Choose AI service for analysis')
+    parser.add_argument('--ai', choices=list(AI_MODELS), default='openai',
+                       help='Choose AI service for analysis (extractive: offline summary, no API key needed)')
     parser.add_argument('--keep_files', action='store_true',
                        help='Keep CSV files after analysis')
+    parser.add_argument('--workers', type=int, default=8,
+                       help='Number of channels scraped concurrently (default: 8)')
+    parser.add_argument('--rate', type=float, default=2.0,
+                       help='Telegram requests per second shared by all workers (default: 2)')
+    parser.add_argument('--incremental', action='store_true',
+                       help='Only fetch messages newer than the last run and merge them into the stored history')
+    parser.add_argument('--entity_ttl', type=float, default=ENTITY_CACHE_TTL_HOURS,
+                       help=f'Hours a resolved channel stays in the entity cache (default: {ENTITY_CACHE_TTL_HOURS})')
+    parser.add_argument('--channels', default=CHANNELS_FILE,
+                       help=f'Channel registry file (default: {CHANNELS_FILE})')
+    parser.add_argument('--flush_every', type=int, default=500,
+                       help='Write scraped messages to disk every N messages (default: 500)')
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv',
+                       help='Message file format; parquet is typed, zstd-compressed and read column by column (default: csv)')
+    parser.add_argument('--index', nargs='?', const='crypto_search.db',
+                       help='Also add messages to a full-text search index, see crypto_cynic_search.py '
+                            '(default file: crypto_search.db)')
+    parser.add_argument('--sharded', action='store_true',
+                       help='Split channels across every account in .env (API_ID_2/API_HASH_2/PHONE_2, ...)')
+    parser.add_argument('--live', action='store_true',
+                       help='Ingest new and edited messages as they are posted, into the history file')
+    parser.add_argument('--queue_size', type=int, default=1000,
+                       help='Live messages buffered before Telegram updates are held back (default: 1000)')
+    parser.add_argument('--alert_threshold', type=int, default=20,
+                       help='Live mode: alert when a coin gets this many mentions within the alert window (default: 20)')
+    parser.add_argument('--alert_window', type=float, default=10,
+                       help='Live mode: alert window in minutes (default: 10)')
+    parser.add_argument('--db', nargs='?', const=DEFAULT_DB_URL,
+                       help=f'Also upsert messages into a database; incremental runs keep their history there '
+                            f'(SQLAlchemy URL, default: {DEFAULT_DB_URL})')
+    parser.add_argument('--stream', action='store_true',
+                       help='Stream the AI summary into the report as it is generated, after the mention table')
+    parser.add_argument('--metrics',
+                       help='Write run metrics to this file: JSON if it ends in .json, else Prometheus text '
+                            '(daemon mode: after every run)')
+    parser.add_argument('--metrics_port', type=int,
+                       help='Daemon and live modes: serve metrics over HTTP on this port for Prometheus')
+    parser.add_argument('--backfill', action='store_true',
+                       help='Build --hours of history page by page without analysis, resuming an interrupted '
+                            f'backfill from {BACKFILL_STATE_FILE}')
+    parser.add_argument('--page_size', type=int, default=BACKFILL_PAGE_SIZE,
+                       help=f'Backfill: messages fetched per page, checkpointed after each (default: {BACKFILL_PAGE_SIZE})')
+    parser.add_argument('--takeout', action='store_true',
+                       help='Backfill: read history through a takeout session, which has looser rate limits')
+    parser.add_argument('--daemon', action='store_true',
+                       help='Stay connected and scrape incrementally and report on a schedule')
+    parser.add_argument('--interval', type=float, default=60,
+                       help='Minutes between scheduled runs in daemon mode (default: 60)')
     args = parser.parse_args()
 
+    if args.backfill:
+        try:
+            asyncio.run(run_backfill(
+                args.hours, args.workers, args.rate, args.entity_ttl, args.channels, args.page_size,
+                args.takeout, args.db, args.sharded, args.index
+            ))
+        except KeyboardInterrupt:
+            logging.info("Backfill stopped, run again to resume")
+        if args.metrics:
+            metrics.export(args.metrics)
+        return
+
+    if args.live and not args.daemon:
+        try:
+            asyncio.run(run_live(
+                args.workers, args.rate, args.entity_ttl, args.channels, args.flush_every,
+                args.queue_size, args.alert_threshold, args.alert_window, args.db, args.metrics_port, args.index
+            ))
+        except KeyboardInterrupt:
+            logging.info("Live ingestion stopped")
+        if args.metrics:
+            metrics.export(args.metrics)
+        return
+
+    if args.daemon:
+        try:
+            asyncio.run(run_daemon(
+                args.hours, args.ai, args.keep_files, args.interval,
+                workers=args.workers, rate=args.rate, entity_ttl=args.entity_ttl,
+                channels_file=args.channels, flush_every=args.flush_every,
+                live=args.live, queue_size=args.queue_size, db_url=args.db,
+                metrics_file=args.metrics, metrics_port=args.metrics_port, file_format=args.format,
+                index_path=args.index, alert_threshold=args.alert_threshold, alert_window=args.alert_window,
+                analyzer_options={'stream': args.stream}
+            ))
+        except KeyboardInterrupt:
+            logging.info("Daemon stopped")
+        return
+
     try:
-        # Run async scraping
-        timestamp = asyncio.run(async_main(args.hours))
-        
-        # Run the analyzer with arguments
-        subprocess.run([
-            'python', 'crypto_cynic_tg_reporter.py',
-            '--ai', args.ai,
-            '--timestamp', timestamp,
-            *(['--keep_files'] if args.keep_files else [])
-        ], check=True)
+        run_pipeline(
+            args.hours, args.ai, args.keep_files, {'stream': args.stream},
+            workers=args.workers, rate=args.rate, incremental=args.incremental,
+            entity_ttl=args.entity_ttl, channels_file=args.channels, flush_every=args.flush_every,
+            db_url=args.db, sharded=args.sharded, file_format=args.format, index_path=args.index
+        )
     except Exception as e:
         logging.error(f"An error occurred: {str(e)}")
+    if args.metrics:
+        metrics.export(args.metrics)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,45 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from crypto_cynic_benchmark import FakeMessage, FakeTelegramClient
+from crypto_cynic_tg_scraper import BackfillState, MessageSink, backfill_channel
+
+
+def hourly_history(count: int) -> list:
+    """`count` messages one hour apart, newest (highest id) first like Telegram history"""
+    now = datetime.now(timezone.utc)
+    return [FakeMessage(message_id, now - timedelta(hours=count - message_id + 0.5), f"message {message_id}", 0, 0)
+            for message_id in range(count, 0, -1)]
+
+
+def backfill(client, state, sink, hours):
+    cutoff = (datetime.now(timezone.utc) - timedelta(hours=hours)).timestamp()
+    state.start('channel', cutoff)
+    return asyncio.run(backfill_channel(client, 'channel', state, sink, page_size=20))
+
+
+def test_longer_window_continues_below_the_oldest_written_message(tmp_path):
+    client = FakeTelegramClient({'channel': hourly_history(50)}, latency=0)
+    state = BackfillState(tmp_path / 'backfill_state.json')
+    sink = MessageSink(lambda channel: [], collect=True)
+
+    assert backfill(client, state, sink, 10)
+    assert sorted(record['message_id'] for record in sink.records) == list(range(41, 51))
+
+    assert backfill(client, state, sink, 30)
+    ids = sorted(record['message_id'] for record in sink.records)
+    assert ids == list(range(21, 51))
+    assert state.jobs['channel']['top_id'] == 50
+
+
+def test_resumes_from_saved_cursor(tmp_path):
+    client = FakeTelegramClient({'channel': hourly_history(50)}, latency=0)
+    path = tmp_path / 'backfill_state.json'
+    sink = MessageSink(lambda channel: [], collect=True)
+    assert backfill(client, BackfillState(path), sink, 100)
+
+    # A reloaded state for a finished job fetches nothing more
+    requests = client.requests
+    assert backfill(client, BackfillState(path), sink, 100)
+    assert client.requests == requests
+    assert sorted(record['message_id'] for record in sink.records) == list(range(1, 51))
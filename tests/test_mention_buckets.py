@@ -0,0 +1,23 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+from crypto_cynic_tg_reporter import CRYPTO_DICT, MentionBuckets, MentionMatcher
+
+
+def test_counts_load_without_the_seen_ids_and_messages_are_counted_once(tmp_path):
+    paths = {'path': str(tmp_path / 'buckets.json'), 'seen_path': str(tmp_path / 'seen.json')}
+    now = datetime.now(timezone.utc)
+    records = [{'channel': 'channel', 'message_id': message_id, 'date': now - timedelta(minutes=message_id),
+                'text': 'BTC breaks out'} for message_id in range(20)]
+    matcher = MentionMatcher(CRYPTO_DICT)
+    buckets = MentionBuckets(**paths)
+    assert buckets.add(records[:10], matcher) == 10
+    buckets.save()
+
+    assert all(set(bucket) == {'counts'} for bucket in json.loads((tmp_path / 'buckets.json').read_text())['buckets'].values())
+    buckets = MentionBuckets(**paths)
+    assert buckets.seen is None
+    assert buckets.window((now - timedelta(hours=1)).timestamp())['bitcoin'] == 10
+
+    assert buckets.add(records, matcher) == 10
+    assert buckets.window((now - timedelta(hours=1)).timestamp())['bitcoin'] == 20
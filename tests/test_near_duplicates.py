@@ -0,0 +1,46 @@
+import random
+
+from crypto_cynic_benchmark import FILLER_WORDS, generate_corpus
+from crypto_cynic_tg_reporter import NearDuplicateFilter
+
+POSTS = [
+    "Binance will list PEPE tomorrow at 10:00 UTC, deposits are already open for all users",
+    "SEC delays its decision on the spot Ethereum ETF applications until the end of next month",
+    "Whales moved 20,000 ETH to exchanges in the last hour, expect volatility on the weekly close",
+    "Solana mainnet upgrade goes live next week with lower fees and faster block confirmation times",
+    "Bitcoin breaks above the 70k resistance with strong volume, next target is the previous all time high",
+    "Coinbase announces partnership with a major bank to offer custody for institutional clients in Europe",
+]
+
+
+def cluster(texts: list) -> list:
+    return NearDuplicateFilter().cluster([{'text': text} for text in texts])
+
+
+def edited(text: str, edits: int, rng: random.Random) -> str:
+    words = text.split()
+    for _ in range(edits):
+        words[rng.randrange(len(words))] = rng.choice(FILLER_WORDS)
+    return ' '.join(words) + ' 🚀'
+
+
+def test_small_edits_collapse():
+    rng = random.Random(1)
+    for post in POSTS:
+        for edits in (1, 2):
+            kept = cluster([post, edited(post, edits, rng)])
+            assert len(kept) == 1
+            assert kept[0]['weight'] == 2
+
+
+def test_cross_posts_with_another_channel_tag_collapse():
+    kept = cluster([f"{post} Join @alpha_signals" for post in POSTS] +
+                   [f"{post} Join @crypto_whales_vip" for post in POSTS])
+    assert len(kept) == len(POSTS)
+    assert all(record['weight'] == 2 for record in kept)
+
+
+def test_distinct_messages_are_kept():
+    assert len(cluster(POSTS)) == len(POSTS)
+    corpus = generate_corpus(2000, seed=5)
+    assert len(cluster(corpus)) >= 0.995 * len(set(corpus))
@@ -0,0 +1,17 @@
+from datetime import datetime, timezone
+
+from crypto_cynic_store import MessageStore
+
+
+def test_a_message_and_its_edit_in_one_batch_keep_the_edit(tmp_path):
+    store = MessageStore(f"sqlite:///{tmp_path / 'messages.db'}")
+    date = datetime(2024, 5, 1, 12, tzinfo=timezone.utc)
+    records = [
+        {'channel': 'channel', 'message_id': 7, 'date': date, 'text': 'BTC to 70k'},
+        {'channel': 'channel', 'message_id': 8, 'date': date, 'text': 'ETH flat'},
+        {'channel': 'channel', 'message_id': 7, 'date': date, 'text': 'BTC to 72k (edited)'},
+    ]
+
+    assert store.upsert(records) == 2
+    texts = {record['message_id']: record['text'] for record in store.messages(date)}
+    assert texts == {7: 'BTC to 72k (edited)', 8: 'ETH flat'}